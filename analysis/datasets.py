@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+import glob
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterable
+
+import polars as pl
+
+DATA_DIRECTORY = "data"
+
+# {asset_name}-{data_type}-{seq_no}.parquet, asset names may themselves contain dashes
+FILE_PATTERN = re.compile(
+    r"^(?P<asset_name>.+)-(?P<data_type>[a-z]+)-(?P<seq_no>\d+)\.parquet$"
+)
+
+
+@dataclass(frozen=True)
+class DataFile:
+    path: str
+    hour: str  # the slug directory the file was rotated into
+    asset_name: str
+    data_type: str
+    seq_no: int
+
+
+def discover(root=DATA_DIRECTORY) -> list[DataFile]:
+    files = []
+    for path in glob.glob(os.path.join(root, "*", "*.parquet")):
+        match = FILE_PATTERN.match(os.path.basename(path))
+        if match is None:
+            continue
+
+        files.append(
+            DataFile(
+                path=path,
+                hour=os.path.basename(os.path.dirname(path)),
+                asset_name=match["asset_name"],
+                data_type=match["data_type"],
+                seq_no=int(match["seq_no"]),
+            )
+        )
+
+    return sorted(files, key=lambda f: (f.hour, f.asset_name, f.data_type, f.seq_no))
+
+
+def next_seq_no(directory: str, asset_name: str, data_type: str) -> int:
+    """The sequence number after the directory's last file of an asset and type."""
+    seq_nos = [
+        int(m["seq_no"])
+        for e in os.listdir(directory)
+        if (m := FILE_PATTERN.match(e))
+        and m["asset_name"] == asset_name
+        and m["data_type"] == data_type
+    ]
+    return max(seq_nos, default=0) + 1
+
+
+def by_hour(files: list[DataFile]) -> dict[str, list[DataFile]]:
+    hours = defaultdict(list)
+    for f in files:
+        hours[f.hour].append(f)
+    return dict(hours)
+
+
+def infer_venue(schema: pl.Schema) -> str:
+    if "backfilled" in schema:  # history fetched after the fact, see backfill.py
+        return "backfill"
+    if "venue" in schema:  # derived rows carry their venue explicitly
+        return "features"
+    if "asset_id" in schema:
+        return "polymarket"
+    if "exchange_timestamp" in schema:
+        return "hyperliquid"
+    return "binance"
+
+
+def scan(files: list[DataFile]) -> dict[tuple[str, str, str], pl.LazyFrame]:
+    """Lazily concatenate the files of each (venue, asset_name, data_type)."""
+    frames = defaultdict(list)
+    for f in files:
+        lf = pl.scan_parquet(f.path)
+        frames[(infer_venue(lf.collect_schema()), f.asset_name, f.data_type)].append(
+            lf
+        )
+
+    return {
+        key: pl.concat(lfs, how="diagonal_relaxed") for key, lfs in frames.items()
+    }
+
+
+def hour_bounds(frames: Iterable[pl.LazyFrame]) -> tuple[datetime, datetime]:
+    """The UTC hour an hour directory's rows belong to.
+
+    Directories are named by market slug and rotated a second before the hour, so
+    the hour is the one the median row falls in.
+    """
+    timestamp = pl.col("timestamp").cast(pl.Datetime("us", "UTC"))
+    median = (
+        pl.concat([lf.select(timestamp) for lf in frames])
+        .select(pl.col("timestamp").median())
+        .collect()
+        .item()
+    )
+    start = median.replace(minute=0, second=0, microsecond=0)
+    return start, start + timedelta(hours=1)
+
+
+def bounded(timestamps: pl.Expr, start: datetime, end: datetime) -> pl.Expr:
+    """Sorted timestamps within the hour, preceded by its start and followed by its end.
+
+    Consecutive differences then include the silences at either edge of the hour.
+    """
+    return pl.lit(start).append(timestamps.sort().clip(start, end)).append(pl.lit(end))
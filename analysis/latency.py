@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+
+import polars as pl
+from loguru import logger
+
+from analysis.datasets import DATA_DIRECTORY, DataFile, by_hour, discover, scan
+
+WINDOW = "1m"
+SPIKE_FACTOR = 3.0  # p99 excess over this multiple of its rolling median is a spike
+SPIKE_LOOKBACK = 30  # windows
+BURST_MADS = 5.0  # message counts this many MADs above the median are a burst
+
+
+@dataclass
+class ClockModel:
+    """Exchange to local clock mapping, fitted on the lower envelope of receive delays.
+
+    Without round trips the clock offset cannot be separated from the minimum one-way
+    latency, so offset_ms is their sum: exchange_timestamp + offset is the earliest the
+    event could have been received locally.
+    """
+
+    venue: str
+    reference: datetime
+    offset_ms: float
+    drift_ppm: float
+
+    def offset_at(self, timestamp: pl.Expr) -> pl.Expr:
+        elapsed = (timestamp - pl.lit(self.reference)).dt.total_microseconds() / 1e6
+        return self.offset_ms + self.drift_ppm / 1000 * elapsed
+
+    def corrected(self, column="exchange_timestamp") -> pl.Expr:
+        offset_us = (self.offset_at(pl.col(column)) * 1000).cast(pl.Int64)
+        return (pl.col(column) + pl.duration(microseconds=offset_us)).alias(
+            f"corrected_{column}"
+        )
+
+
+def hour_windows(files: list[DataFile], window=WINDOW) -> pl.DataFrame:
+    per_venue = {}
+    for (venue, _, _), lf in scan(files).items():
+        if "exchange_timestamp" not in lf.collect_schema():
+            continue
+        per_venue.setdefault(venue, []).append(
+            lf.select(
+                "timestamp",
+                (
+                    (pl.col("timestamp") - pl.col("exchange_timestamp"))
+                    .dt.total_microseconds()
+                    .cast(pl.Float64)
+                    / 1000
+                ).alias("delay_ms"),
+            )
+        )
+
+    windows = []
+    for venue, lfs in per_venue.items():
+        windows.append(
+            pl.concat(lfs)
+            .sort("timestamp")
+            .group_by_dynamic("timestamp", every=window)
+            .agg(
+                pl.len().alias("messages"),
+                pl.col("delay_ms").min().alias("min_ms"),
+                pl.col("delay_ms").quantile(0.5).alias("p50_ms"),
+                pl.col("delay_ms").quantile(0.9).alias("p90_ms"),
+                pl.col("delay_ms").quantile(0.99).alias("p99_ms"),
+                pl.col("delay_ms").max().alias("max_ms"),
+            )
+            .with_columns(pl.lit(venue).alias("venue"))
+            .collect()
+        )
+
+    return pl.concat(windows) if windows else pl.DataFrame()
+
+
+def fit_clock(venue: str, windows: pl.DataFrame) -> ClockModel:
+    reference = windows["timestamp"].min()
+    fit = windows.select(
+        t=(pl.col("timestamp") - pl.lit(reference)).dt.total_microseconds() / 1e6,
+        y=pl.col("min_ms"),
+    ).select(
+        slope=pl.cov("t", "y") / pl.col("t").var(),
+        t_mean=pl.col("t").mean(),
+        y_mean=pl.col("y").mean(),
+    )
+    slope = fit["slope"][0]
+    if slope is None or slope != slope:  # a single window has no drift to fit
+        slope = 0.0
+
+    return ClockModel(
+        venue=venue,
+        reference=reference,
+        offset_ms=fit["y_mean"][0] - slope * fit["t_mean"][0],
+        drift_ppm=slope * 1000,
+    )
+
+
+def flag(windows: pl.DataFrame, model: ClockModel) -> pl.DataFrame:
+    envelope = model.offset_at(pl.col("timestamp"))
+    messages = pl.col("messages")
+    mad = (messages - messages.median()).abs().median()
+    return (
+        windows.sort("timestamp")
+        .with_columns(
+            (pl.col("p50_ms") - envelope).alias("p50_excess_ms"),
+            (pl.col("p99_ms") - envelope).alias("p99_excess_ms"),
+        )
+        .with_columns(
+            (
+                pl.col("p99_excess_ms")
+                > SPIKE_FACTOR
+                * pl.col("p99_excess_ms").rolling_median(
+                    SPIKE_LOOKBACK, min_samples=1
+                )
+            ).alias("spike"),
+            (
+                messages > messages.median() + BURST_MADS * pl.max_horizontal(mad, 1)
+            ).alias("burst"),
+        )
+    )
+
+
+def analyze(files: list[DataFile], window=WINDOW, workers=None):
+    hours = by_hour(files)
+    # spawn, polars' thread pool does not survive a fork
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        parts = [
+            w
+            for w in executor.map(
+                hour_windows, hours.values(), [window] * len(hours)
+            )
+            if not w.is_empty()
+        ]
+
+    if not parts:
+        return {}, pl.DataFrame()
+
+    windows = pl.concat(parts)
+    models = {}
+    flagged = []
+    for (venue,), venue_windows in windows.group_by("venue"):
+        models[venue] = fit_clock(venue, venue_windows)
+        flagged.append(flag(venue_windows, models[venue]))
+
+    return models, pl.concat(flagged).sort("venue", "timestamp")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Estimate exchange clock offset, drift and receive latency."
+    )
+    parser.add_argument("--data", default=DATA_DIRECTORY)
+    parser.add_argument("--window", default=WINDOW)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="latency-windows.parquet")
+    parser.add_argument("--models", default="clock_models.json")
+    args = parser.parse_args()
+
+    files = discover(args.data)
+    logger.info("Scanning {} files in {}", len(files), args.data)
+    models, windows = analyze(files, args.window, args.workers)
+    if not models:
+        logger.warning("No data with exchange timestamps found")
+        return
+
+    windows.write_parquet(args.output)
+    with open(args.models, "w") as f:
+        json.dump(
+            {v: asdict(m) for v, m in models.items()}, f, indent=4, default=str
+        )
+
+    for venue, model in models.items():
+        w = windows.filter(pl.col("venue") == venue)
+        logger.info(
+            "{}: offset {:.1f} ms, drift {:.2f} ppm, median p50 excess {:.1f} ms, "
+            "worst p99 excess {:.1f} ms, {} spike and {} burst windows of {}",
+            venue,
+            model.offset_ms,
+            model.drift_ppm,
+            w["p50_excess_ms"].median(),
+            w["p99_excess_ms"].max(),
+            w["spike"].sum(),
+            w["burst"].sum(),
+            len(w),
+        )
+    logger.info("Wrote {} and {}", args.output, args.models)
+
+
+if __name__ == "__main__":
+    main()
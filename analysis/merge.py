@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+
+import argparse
+import multiprocessing
+import os
+import shutil
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import polars as pl
+from loguru import logger
+
+from analysis.datasets import discover
+from symbols import SYMBOL_COLUMNS, SYMBOLS_FILE
+
+MERGED_DIRECTORY = "merged"
+# stamped by the venue, so identical on every instance that received the event
+EXCHANGE_KEYS = ("exchange_timestamp", "update_id", "agg_trade_id")
+RECEIVE_TIMESTAMP = "timestamp"
+
+
+def parse_instances(args: list[str]) -> dict[str, str]:
+    """NAME=PATH or PATH (named by the path) per capture instance."""
+    instances = {}
+    for arg in args:
+        name, _, path = arg.rpartition("=")
+        instances[name or os.path.normpath(path)] = path
+    return instances
+
+
+def group_files(instances: dict[str, str]) -> dict[tuple, dict[str, list[str]]]:
+    """(hour, asset_name, data_type) -> instance -> that instance's files."""
+    groups = defaultdict(lambda: defaultdict(list))
+    for instance, root in instances.items():
+        for f in discover(root):
+            groups[(f.hour, f.asset_name, f.data_type)][instance].append(f.path)
+
+    return {key: dict(files) for key, files in groups.items()}
+
+
+def _scan(instance: str, paths: list[str]) -> pl.LazyFrame:
+    # categoricals from different files and hosts do not share codes, compare strings
+    return pl.concat(
+        [
+            pl.scan_parquet(p).with_columns(pl.col(pl.Categorical).cast(pl.String))
+            for p in paths
+        ],
+        how="diagonal_relaxed",
+    ).with_columns(pl.lit(instance).alias("instance"))
+
+
+def _keyed(lf: pl.LazyFrame) -> tuple[pl.LazyFrame, list[str]]:
+    """Rows with the columns that identify an event.
+
+    Identical rows of one instance within the same millisecond can be separate
+    events, so the n-th of them in receive order only matches the n-th of another
+    instance. A row written twice, received at the same time, is one event.
+    """
+    received = pl.col(RECEIVE_TIMESTAMP)
+    content = [
+        c
+        for c in lf.collect_schema().names()
+        if c not in (RECEIVE_TIMESTAMP, "instance")
+    ]
+    keyed = lf.unique().with_columns(
+        received.rank("ordinal").over(["instance", *content]).alias("occurrence")
+    )
+    return keyed, [*content, "occurrence"]
+
+
+def dedupe(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """One row per event, at the earliest receive time.
+
+    Rows of all instances with the same exchange key and content are one event.
+    first_instance is the instance that received it first and instances how many
+    received it at all.
+    """
+    received = pl.col(RECEIVE_TIMESTAMP)
+    keyed, key = _keyed(lf)
+    content = key[:-1]
+    return (
+        keyed.group_by(key)
+        .agg(
+            received.min(),
+            pl.col("instance").sort_by(received).first().alias("first_instance"),
+            pl.col("instance").n_unique().alias("instances"),
+        )
+        .select(RECEIVE_TIMESTAMP, *content, "first_instance", "instances")
+        .sort(RECEIVE_TIMESTAMP)
+    )
+
+
+def received_events(lf: pl.LazyFrame) -> dict[str, int]:
+    """Distinct events per instance, rows it wrote twice count once."""
+    counts = _keyed(lf)[0].group_by("instance").agg(pl.len()).collect()
+    return dict(zip(counts["instance"], counts["len"]))
+
+
+def _rows(paths: list[str]) -> int:
+    return pl.scan_parquet(paths).select(pl.len()).collect().item()
+
+
+def merge_group(
+    key: tuple, files: dict[str, list[str]], output_root: str
+) -> list[dict]:
+    hour, asset_name, data_type = key
+    frames = {instance: _scan(instance, paths) for instance, paths in files.items()}
+    schema = pl.concat(frames.values(), how="diagonal_relaxed").collect_schema()
+    rows = {instance: _rows(paths) for instance, paths in files.items()}
+
+    if any(k in schema for k in EXCHANGE_KEYS):
+        combined = pl.concat(frames.values(), how="diagonal_relaxed")
+        merged = dedupe(combined)
+        received = received_events(combined)
+    else:
+        # receive times are all these rows have, identical quotes at different times
+        # are different events, so the instance with the most rows is kept whole
+        instance = max(rows, key=rows.get)
+        logger.warning(
+            "No exchange key in {} {} {}, keeping {}",
+            hour,
+            asset_name,
+            data_type,
+            instance,
+        )
+        merged = (
+            frames[instance]
+            .rename({"instance": "first_instance"})
+            .with_columns(pl.lit(1, pl.UInt32).alias("instances"))
+        )
+        received = rows
+
+    directory = os.path.join(output_root, hour)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{asset_name}-{data_type}-1.parquet")
+    merged.with_columns(
+        pl.col("first_instance").cast(pl.Categorical),
+        *(pl.col(c).cast(pl.Categorical) for c in SYMBOL_COLUMNS if c in schema),
+    ).sink_parquet(path, compression="zstd")
+
+    firsts = (
+        pl.scan_parquet(path)
+        .group_by("first_instance")
+        .agg(pl.len().alias("first"))
+        .collect()
+    )
+    first = dict(zip(firsts["first_instance"].cast(pl.String), firsts["first"]))
+    events = sum(first.values())
+    logger.info(
+        "Merged {} {} {}: {} rows from {} instances into {} events",
+        hour,
+        asset_name,
+        data_type,
+        sum(rows.values()),
+        len(files),
+        events,
+    )
+
+    return [
+        {
+            "hour": hour,
+            "asset_name": asset_name,
+            "data_type": data_type,
+            "instance": instance,
+            "rows": rows.get(instance, 0),
+            "received": received.get(instance, 0),
+            "first": first.get(instance, 0),
+            "events": events,
+        }
+        for instance in files
+    ]
+
+
+def merge_extras(hour: str, instances: dict[str, str], output_root: str):
+    directory = os.path.join(output_root, hour)
+    hour_directories = [os.path.join(root, hour) for root in instances.values()]
+
+    # the opening prices are the same wherever they were fetched
+    for d in hour_directories:
+        if os.path.exists(os.path.join(d, "targets.json")):
+            shutil.copy(os.path.join(d, "targets.json"), directory)
+            break
+
+    # symbol ids are per process, the merged table numbers the union afresh
+    tables = [
+        pl.scan_parquet(os.path.join(d, SYMBOLS_FILE))
+        for d in hour_directories
+        if os.path.exists(os.path.join(d, SYMBOLS_FILE))
+    ]
+    if tables:
+        (
+            pl.concat(tables)
+            .select("symbol")
+            .unique(maintain_order=True)
+            .with_row_index("id")
+            .collect()
+            .write_parquet(os.path.join(directory, SYMBOLS_FILE))
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Merge the data directories of several capture instances."
+    )
+    parser.add_argument(
+        "instances",
+        nargs="+",
+        help="data directory per instance, as NAME=PATH or PATH",
+    )
+    parser.add_argument("--output", default=MERGED_DIRECTORY)
+    parser.add_argument("--hours", nargs="*", help="only merge these hour directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--summary", help="write per instance coverage to this CSV")
+    args = parser.parse_args()
+
+    instances = parse_instances(args.instances)
+    groups = {
+        key: files
+        for key, files in group_files(instances).items()
+        if not args.hours or key[0] in args.hours
+    }
+    logger.info(
+        "Merging {} file sets from {} instances into {}",
+        len(groups),
+        len(instances),
+        args.output,
+    )
+    if not groups:
+        logger.warning("No captured data found")
+        return
+
+    # one file set per task, each streamed from its inputs to one output file;
+    # spawn, polars' thread pool does not survive a fork
+    with ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        parts = executor.map(
+            merge_group,
+            groups.keys(),
+            groups.values(),
+            [args.output] * len(groups),
+        )
+        summary = pl.DataFrame([row for part in parts for row in part])
+
+    for hour in summary["hour"].unique():
+        merge_extras(hour, instances, args.output)
+
+    # file sets an instance has no files for still count against its coverage
+    events = summary.unique(["hour", "asset_name", "data_type"])["events"].sum()
+    coverage = (
+        summary.group_by("instance")
+        .agg(pl.col("rows").sum(), pl.col("received").sum(), pl.col("first").sum())
+        .with_columns(
+            (pl.col("received") / events).alias("coverage"),
+            (pl.col("first") / events).alias("first_share"),
+        )
+        .sort("instance")
+    )
+    with pl.Config(tbl_rows=-1):
+        print(coverage)
+
+    if args.summary:
+        summary.write_csv(args.summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import polars as pl
+from loguru import logger
+
+from analysis.datasets import (
+    DATA_DIRECTORY,
+    DataFile,
+    bounded,
+    by_hour,
+    discover,
+    hour_bounds,
+    scan,
+)
+
+GAP_SECONDS = 60  # orderbook silence longer than this is reported as a gap
+ANOMALY_MADS = 5.0  # hourly row counts this many MADs from the median are anomalous
+ANOMALY_RATIO = 0.5  # or below this fraction of the median
+MIN_MAD_RATIO = 0.05  # MAD floor, so very steady feeds do not flag small deviations
+
+
+def _top(schema: pl.Schema, side: str) -> str | None:
+    for name in (f"{side}_1_price", f"{side}_price"):
+        if name in schema:
+            return name
+    return None
+
+
+def checks(
+    lf: pl.LazyFrame,
+    data_type: str,
+    gap_seconds: float,
+    start: datetime,
+    end: datetime,
+) -> pl.LazyFrame:
+    schema = lf.collect_schema()
+    timestamp = pl.col("timestamp")
+    # a feed that stopped before the hour ended, or started late, is silent up to it
+    gaps = bounded(timestamp, start, end).diff().dt.total_microseconds() / 1e6
+
+    exprs = [
+        pl.len().alias("rows"),
+        timestamp.min().alias("first_timestamp"),
+        timestamp.max().alias("last_timestamp"),
+    ]
+    if data_type == "orderbook":
+        # trades are legitimately sparse, only a silent book is a gap
+        exprs += [
+            (gaps > gap_seconds).sum().alias("gaps"),
+            gaps.max().alias("max_gap_seconds"),
+        ]
+
+    bid, ask = _top(schema, "bid"), _top(schema, "ask")
+    if bid and ask:
+        exprs += [
+            (pl.col(bid) > pl.col(ask)).sum().alias("crossed"),
+            (pl.col(bid) == pl.col(ask)).sum().alias("locked"),
+        ]
+
+    sizes = [c for c in schema if c.endswith("_size") or c == "size"]
+    if sizes:
+        exprs.append(
+            pl.any_horizontal(pl.col(c) <= 0 for c in sizes)
+            .sum()
+            .alias("nonpositive_sizes")
+        )
+
+    if "exchange_timestamp" in schema:
+        # rows are stored in arrival order, the exchange should never go backwards
+        exprs.append(
+            (pl.col("exchange_timestamp").diff().dt.total_microseconds() < 0)
+            .sum()
+            .alias("out_of_order")
+        )
+
+    return lf.select(exprs)
+
+
+def scan_hour(
+    hour: str, files: list[DataFile], gap_seconds=GAP_SECONDS
+) -> pl.DataFrame:
+    frames = {key: lf for key, lf in scan(files).items() if key[0] != "features"}
+    if not frames:
+        return pl.DataFrame()
+
+    start, end = hour_bounds(frames.values())
+    results = pl.collect_all(
+        [checks(lf, key[2], gap_seconds, start, end) for key, lf in frames.items()]
+    )
+
+    rows = [
+        result.select(
+            hour=pl.lit(hour),
+            hour_start=pl.lit(start),
+            venue=pl.lit(venue),
+            asset_name=pl.lit(asset_name),
+            data_type=pl.lit(data_type),
+        ).hstack(result)
+        for (venue, asset_name, data_type), result in zip(frames, results)
+    ]
+    return pl.concat(rows, how="diagonal_relaxed")
+
+
+def silent_assets(summary: pl.DataFrame) -> pl.DataFrame:
+    """Rows for file sets with no data in an hour between their first and last."""
+    key = ["venue", "asset_name", "data_type"]
+    hour_start = pl.col("hour_start")
+    orderbook = pl.col("data_type") == "orderbook"
+    return (
+        summary.group_by(key)
+        .agg(hour_start.min().alias("first"), hour_start.max().alias("last"))
+        .join(summary.select("hour", "hour_start").unique(), how="cross")
+        .filter(hour_start.is_between(pl.col("first"), pl.col("last")))
+        .join(summary, on=["hour", *key], how="anti")
+        .select(
+            "hour",
+            "hour_start",
+            *key,
+            rows=pl.lit(0, pl.UInt32),
+            gaps=pl.when(orderbook).then(pl.lit(1, pl.UInt32)),
+            max_gap_seconds=pl.when(orderbook).then(pl.lit(3600.0)),
+        )
+    )
+
+
+def flag_anomalies(summary: pl.DataFrame) -> pl.DataFrame:
+    rows = pl.col("rows")
+    median = pl.col("typical_rows")
+    group = ("venue", "asset_name", "data_type")
+    return (
+        summary.with_columns(rows.median().over(group).alias("typical_rows"))
+        .with_columns((rows - median).abs().median().over(group).alias("mad"))
+        .with_columns(
+            (
+                (
+                    (rows - median).abs()
+                    > ANOMALY_MADS * pl.max_horizontal("mad", MIN_MAD_RATIO * median)
+                )
+                | (rows < ANOMALY_RATIO * median)
+            ).alias("row_count_anomaly"),
+        )
+        .drop("mad")
+    )
+
+
+def issues(row: dict) -> list[str]:
+    found = []
+    for check in ("gaps", "crossed", "locked", "nonpositive_sizes", "out_of_order"):
+        if row.get(check):
+            found.append(f"{row[check]} {check.replace('_', ' ')}")
+    if row["row_count_anomaly"]:
+        found.append(f"{row['rows']} rows against a typical {row['typical_rows']:.0f}")
+    return found
+
+
+def write_reports(summary: pl.DataFrame, root: str, output: str) -> int:
+    os.makedirs(output, exist_ok=True)
+    problems = 0
+    for (hour,), rows in summary.group_by("hour"):
+        report = {
+            "hour": hour,
+            "targets": os.path.exists(os.path.join(root, hour, "targets.json")),
+            "assets": [],
+        }
+        for row in rows.sort("venue", "asset_name", "data_type").to_dicts():
+            row["issues"] = issues(row)
+            report["assets"].append(row)
+            problems += bool(row["issues"])
+        problems += not report["targets"]
+
+        with open(os.path.join(output, f"{hour}.json"), "w") as f:
+            json.dump(report, f, indent=4, default=str)
+
+    summary.write_parquet(os.path.join(output, "quality.parquet"))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check captured hours for gaps, crossed books and other problems."
+    )
+    parser.add_argument("--data", default=DATA_DIRECTORY)
+    parser.add_argument("--gap-seconds", type=float, default=GAP_SECONDS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="quality")
+    args = parser.parse_args()
+
+    hours = by_hour(discover(args.data))
+    logger.info("Scanning {} hours in {}", len(hours), args.data)
+
+    # spawn, polars' thread pool does not survive a fork
+    with ProcessPoolExecutor(
+        max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        parts = [
+            p
+            for p in executor.map(
+                scan_hour,
+                hours.keys(),
+                hours.values(),
+                [args.gap_seconds] * len(hours),
+            )
+            if not p.is_empty()
+        ]
+
+    if not parts:
+        logger.warning("No captured data found")
+        return
+
+    summary = pl.concat(parts, how="diagonal_relaxed")
+    summary = flag_anomalies(
+        pl.concat([summary, silent_assets(summary)], how="diagonal_relaxed")
+    )
+    problems = write_reports(summary, args.data, args.output)
+    logger.info(
+        "Wrote {} hourly reports to {}, {} problems found",
+        len(hours),
+        args.output,
+        problems,
+    )
+
+
+if __name__ == "__main__":
+    main()
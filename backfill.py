@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+from loguru import logger
+
+from analysis.datasets import (
+    DATA_DIRECTORY,
+    bounded,
+    by_hour,
+    discover,
+    hour_bounds,
+    next_seq_no,
+    scan,
+)
+from constants import BINANCE_API_URL, HYPERLIQUID_API_URL
+from utils import RateLimiter, convert_timestamp, make_session
+
+GAP_SECONDS = 60
+WORKERS = 8
+REQUESTS_PER_SECOND = {"binance": 10.0, "hyperliquid": 5.0}
+BACKFILL_LOG = "backfill.json"  # gaps already filled, per hour directory
+
+# Binance only serves aggTrades by time within one hour windows
+MAX_AGG_TRADES_WINDOW = timedelta(hours=1)
+
+
+@dataclass(frozen=True)
+class Gap:
+    hour: str
+    venue: str
+    asset_name: str
+    start: datetime
+    end: datetime
+
+    def key(self) -> str:
+        return f"{self.venue}:{self.asset_name}:{self.start.isoformat()}"
+
+
+def _ms(t: datetime) -> int:
+    return int(t.timestamp() * 1000)
+
+
+def _silences(
+    lf: pl.LazyFrame, start: datetime, end: datetime, gap_seconds: float
+) -> pl.LazyFrame:
+    # the hour's bounds included, so silences at either edge are gaps too
+    timestamps = bounded(pl.col("timestamp"), start, end)
+    return (
+        lf.select(timestamps.shift().alias("start"), timestamps.alias("end"))
+        .filter(pl.col("end") - pl.col("start") > timedelta(seconds=gap_seconds))
+    )
+
+
+def find_gaps(root=DATA_DIRECTORY, gap_seconds=GAP_SECONDS) -> list[Gap]:
+    gaps = []
+    hours = {}  # hour -> its bounds
+    seen = defaultdict(set)  # (venue, asset) -> hours it has rows in
+    # (venue, asset) -> the asset's name in its rows, as the venue spells it; the coin
+    # for Hyperliquid books written per aggregation level
+    names = {}
+    for hour, files in by_hour(discover(root)).items():
+        frames = {
+            (venue, asset_name): lf
+            for (venue, asset_name, data_type), lf in scan(files).items()
+            if venue in REQUESTS_PER_SECOND and data_type == "orderbook"
+        }
+        if not frames:
+            continue
+
+        start, end = hours[hour] = hour_bounds(frames.values())
+        results = pl.collect_all(
+            [_silences(lf, start, end, gap_seconds) for lf in frames.values()]
+            + [
+                lf.select(
+                    pl.col("coin" if "coin" in lf.collect_schema() else "asset_name")
+                    .first()
+                    .cast(pl.String)
+                )
+                for lf in frames.values()
+            ]
+        )
+        for key, silences, name in zip(frames, results, results[len(frames) :]):
+            seen[key].add(hour)
+            names[key] = name.item()
+            for row in silences.iter_rows(named=True):
+                gaps.append(Gap(hour, key[0], names[key], row["start"], row["end"]))
+
+    # an asset without a single row in an hour between its first and last
+    for key, asset_hours in seen.items():
+        first = min(hours[h][0] for h in asset_hours)
+        last = max(hours[h][0] for h in asset_hours)
+        for hour, (start, end) in hours.items():
+            if hour not in asset_hours and first < start < last:
+                gaps.append(Gap(hour, key[0], names[key], start, end))
+
+    filled = {}
+    for hour in hours:
+        try:
+            with open(os.path.join(root, hour, BACKFILL_LOG)) as f:
+                filled[hour] = set(json.load(f))
+        except FileNotFoundError:
+            filled[hour] = set()
+
+    # every aggregation level of a coin silenced by one disconnect has the same gap
+    return [gap for gap in dict.fromkeys(gaps) if gap.key() not in filled[gap.hour]]
+
+
+class Backfiller:
+    def __init__(
+        self,
+        workers=WORKERS,
+        binance_url=BINANCE_API_URL,
+        hyperliquid_url=HYPERLIQUID_API_URL,
+    ):
+        self.session = make_session(pool_size=workers)
+        self.workers = workers
+        self.binance_url = binance_url
+        self.hyperliquid_url = hyperliquid_url
+        self.limiters = {v: RateLimiter(r) for v, r in REQUESTS_PER_SECOND.items()}
+
+    def _get(self, venue: str, url: str, **kwargs):
+        self.limiters[venue].wait()
+        response = self.session.get(url, timeout=10, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def _post(self, venue: str, url: str, body: dict):
+        self.limiters[venue].wait()
+        response = self.session.post(url, json=body, timeout=10)
+        response.raise_for_status()
+        return response.json()
+
+    def binance_agg_trades(
+        self, symbol: str, start: datetime, end: datetime
+    ) -> list[dict]:
+        url = f"{self.binance_url}/v3/aggTrades"
+        trades = self._get(
+            "binance",
+            url,
+            params={
+                "symbol": symbol,
+                "startTime": _ms(start),
+                "endTime": _ms(end),
+                "limit": 1000,
+            },
+        )
+        page = trades
+        # later pages by id, Binance does not accept fromId together with a time range
+        while len(page) == 1000 and page[-1]["T"] <= _ms(end):
+            page = self._get(
+                "binance",
+                url,
+                params={"symbol": symbol, "fromId": page[-1]["a"] + 1, "limit": 1000},
+            )
+            trades += [t for t in page if t["T"] <= _ms(end)]
+
+        return [
+            {
+                "timestamp": convert_timestamp(t["T"]),
+                "asset_name": symbol,
+                "venue": "binance",
+                "agg_trade_id": t["a"],
+                "side": "SELL" if t["m"] else "BUY",  # buyer is the maker on a sell
+                "price": float(t["p"]),
+                "size": float(t["q"]),
+                "backfilled": True,
+            }
+            for t in trades
+        ]
+
+    def binance_klines(self, symbol: str, start: datetime, end: datetime) -> list[dict]:
+        rows = []
+        start_ms = _ms(start)
+        while start_ms <= _ms(end):
+            klines = self._get(
+                "binance",
+                f"{self.binance_url}/v3/klines",
+                params={
+                    "symbol": symbol,
+                    "interval": "1m",
+                    "startTime": start_ms,
+                    "endTime": _ms(end),
+                    "limit": 1000,
+                },
+            )
+            if not klines:
+                break
+            rows += [
+                {
+                    "timestamp": convert_timestamp(k[0]),
+                    "asset_name": symbol,
+                    "venue": "binance",
+                    "open": float(k[1]),
+                    "high": float(k[2]),
+                    "low": float(k[3]),
+                    "close": float(k[4]),
+                    "volume": float(k[5]),
+                    "trades": int(k[8]),
+                    "backfilled": True,
+                }
+                for k in klines
+            ]
+            start_ms = klines[-1][0] + 60_000
+
+        return rows
+
+    def hyperliquid_candles(
+        self, coin: str, start: datetime, end: datetime
+    ) -> list[dict]:
+        rows = []
+        start_ms = _ms(start)
+        while start_ms <= _ms(end):
+            candles = self._post(
+                "hyperliquid",
+                self.hyperliquid_url,
+                {
+                    "type": "candleSnapshot",
+                    "req": {
+                        "coin": coin,
+                        "interval": "1m",
+                        "startTime": start_ms,
+                        "endTime": _ms(end),
+                    },
+                },
+            )
+            if not candles:
+                break
+            rows += [
+                {
+                    "timestamp": convert_timestamp(c["t"]),
+                    "asset_name": coin,
+                    "venue": "hyperliquid",
+                    "open": float(c["o"]),
+                    "high": float(c["h"]),
+                    "low": float(c["l"]),
+                    "close": float(c["c"]),
+                    "volume": float(c["v"]),
+                    "trades": int(c["n"]),
+                    "backfilled": True,
+                }
+                for c in candles
+            ]
+            start_ms = candles[-1]["t"] + 60_000
+
+        return rows
+
+    def tasks(self, gap: Gap):
+        # candles cover every minute the gap touches, trades only the gap itself
+        minute_start = gap.start.replace(second=0, microsecond=0)
+        match gap.venue:
+            case "binance":
+                start = gap.start
+                while start < gap.end:
+                    end = min(start + MAX_AGG_TRADES_WINDOW, gap.end)
+                    yield "trade", self.binance_agg_trades, start, end
+                    start = end
+                yield "candle", self.binance_klines, minute_start, gap.end
+            case "hyperliquid":
+                yield "candle", self.hyperliquid_candles, minute_start, gap.end
+
+    def run(self, gaps: list[Gap], root=DATA_DIRECTORY) -> int:
+        # the venues may still be publishing the current hour's trades and candles
+        hour_start = datetime.now(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        unfinished = [gap for gap in gaps if gap.end > hour_start]
+        if unfinished:
+            logger.info("Skipping {} gaps in the current hour", len(unfinished))
+            gaps = [gap for gap in gaps if gap.end <= hour_start]
+
+        results = defaultdict(list)  # (hour, asset_name, data_type) -> rows
+        fetched = Counter()  # gap -> rows fetched for it
+        failed = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(fetch, gap.asset_name, start, end): (gap, data_type)
+                for gap in gaps
+                for data_type, fetch, start, end in self.tasks(gap)
+            }
+            for future in as_completed(futures):
+                gap, data_type = futures[future]
+                try:
+                    data = future.result()
+                    results[(gap.hour, gap.asset_name, data_type)] += data
+                    fetched[gap] += len(data)
+                except Exception as e:
+                    logger.error("Backfill of {} failed: {}", gap, e)
+                    failed.add(gap)
+
+        rows = 0
+        for (hour, asset_name, data_type), data in results.items():
+            if data:
+                rows += len(data)
+                write(os.path.join(root, hour), asset_name, data_type, data)
+
+        # a gap nothing came back for is tried again next run, the venue may not have
+        # published it yet
+        by_dir = defaultdict(list)
+        for gap in gaps:
+            if gap not in failed and fetched[gap]:
+                by_dir[gap.hour].append(gap.key())
+        for hour, keys in by_dir.items():
+            _log_filled(os.path.join(root, hour), keys)
+
+        return rows
+
+
+def write(directory: str, asset_name: str, data_type: str, data: list[dict]):
+    asset_name = asset_name.lower()
+    seq_no = next_seq_no(directory, asset_name, data_type)
+    path = os.path.join(directory, f"{asset_name}-{data_type}-{seq_no}.parquet")
+    pl.DataFrame(data).unique(maintain_order=True).sort("timestamp").write_parquet(
+        path, compression="zstd"
+    )
+    logger.info("Backfilled {} {} rows into {}", len(data), data_type, path)
+
+
+def _log_filled(directory: str, keys: list[str]):
+    path = os.path.join(directory, BACKFILL_LOG)
+    try:
+        with open(path) as f:
+            filled = json.load(f)
+    except FileNotFoundError:
+        filled = []
+    with open(path, "w") as f:
+        json.dump(sorted(set(filled) | set(keys)), f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Backfill Binance and Hyperliquid history for captured gaps."
+    )
+    parser.add_argument("--data", default=DATA_DIRECTORY)
+    parser.add_argument("--gap-seconds", type=float, default=GAP_SECONDS)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="only list the gaps")
+    args = parser.parse_args()
+
+    gaps = find_gaps(args.data, args.gap_seconds)
+    logger.info("Found {} gaps to backfill", len(gaps))
+    for gap in gaps:
+        logger.info(
+            "{} {} {}: {} to {}",
+            gap.hour,
+            gap.venue,
+            gap.asset_name,
+            gap.start,
+            gap.end,
+        )
+    if args.dry_run or not gaps:
+        return
+
+    rows = Backfiller(args.workers).run(gaps, args.data)
+    logger.info("Backfilled {} rows", rows)
+
+
+if __name__ == "__main__":
+    main()
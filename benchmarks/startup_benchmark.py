@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import polars as pl
+from loguru import logger
+
+from simulator.load_test import wait_for_port
+from simulator.server import VENUES
+
+SYMBOLS = {
+    "binance": ["btcusdt"],
+    "hyperliquid": ["BTC"],
+    "polymarket": ["bitcoin-up-or-down"],
+}
+
+
+def import_times(module: str) -> dict[str, float]:
+    """Cumulative import time in ms of every module, from one fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def first_event_seconds(venue: str, env: dict) -> float:
+    """Seconds from starting a capture process to its first event for the venue."""
+    with tempfile.TemporaryDirectory(prefix="startup-") as output_dir:
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup_benchmark", "--child", venue],
+            cwd=output_dir,
+            env=env | {"PYTHONPATH": os.getcwd()},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+            timeout=60,
+        )
+        return time.perf_counter() - start
+
+
+def _child(venue: str):
+    # what capture.py does before its first event, minus the other venues
+    import capture
+    from bus.event_bus import EVENT_BUS
+    from capture_plan import parse_capture_plan
+    from writers.venue_writer import VenueWriter
+
+    venue_plan = parse_capture_plan(
+        {"venues": {venue: {"symbols": SYMBOLS[venue]}}}
+    ).venues[venue]
+    EVENT_BUS.subscribe(lambda *_: os._exit(0), venues=[venue])
+
+    capture.running[venue] = (venue_plan, [])
+    capture.run_venue_capture_thread(venue_plan, VenueWriter(venue, progress=False))
+    time.sleep(60)
+    os._exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure capture import time and time to first event."
+    )
+    parser.add_argument("--venues", nargs="+", choices=VENUES, default=VENUES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="capture")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--max-import-ms",
+        type=float,
+        help="exit with an error if the median import time is above this",
+    )
+    parser.add_argument(
+        "--max-first-event-ms",
+        type=float,
+        help="exit with an error if a venue's median time to first event is above this",
+    )
+    parser.add_argument("--output", help="write results to this CSV file")
+    parser.add_argument("--child", choices=VENUES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child)
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    modules = pl.DataFrame(
+        [{"module": m, "ms": ms} for times in runs for m, ms in times.items()]
+    )
+    slowest = (
+        modules.group_by("module")
+        .agg(pl.col("ms").median())
+        .sort("ms", descending=True)
+        .head(args.top)
+    )
+    with pl.Config(tbl_rows=-1, fmt_str_lengths=80):
+        print(slowest)
+
+    results = [
+        {
+            "measure": f"import {args.module}",
+            "median_ms": statistics.median(t[args.module] for t in runs),
+            "max_ms": max(t[args.module] for t in runs),
+        }
+    ]
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "simulator.server",
+            "--host",
+            args.host,
+            "--port",
+            str(args.port),
+            "--rate",
+            "100",
+        ],
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.host, args.port)
+        base = f"ws://{args.host}:{args.port}"
+        env = os.environ | {
+            "BINANCE_WSS_URL": f"{base}/binance",
+            "HYPERLIQUID_WSS_URL": f"{base}/hyperliquid/ws",
+            "POLYMARKET_WSS_URL": f"{base}/polymarket",
+            "POLYMARKET_GAMMA_URL": f"http://{args.host}:{args.port}/polymarket",
+        }
+        for venue in args.venues:
+            seconds = [first_event_seconds(venue, env) for _ in range(args.runs)]
+            results.append(
+                {
+                    "measure": f"{venue} first event",
+                    "median_ms": statistics.median(seconds) * 1000,
+                    "max_ms": max(seconds) * 1000,
+                }
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = pl.DataFrame(results)
+    with pl.Config(tbl_rows=-1):
+        print(results)
+
+    if args.output:
+        results.write_csv(args.output)
+
+    failed = []
+    for r in results.iter_rows(named=True):
+        limit = (
+            args.max_import_ms
+            if r["measure"].startswith("import")
+            else args.max_first_event_ms
+        )
+        if limit is not None and r["median_ms"] > limit:
+            failed.append(r["measure"])
+    if failed:
+        logger.error("Startup over budget: {}", ", ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta, timezone
+
+import polars as pl
+from loguru import logger
+
+from analysis.datasets import infer_venue
+from symbols import SYMBOL_COLUMNS, SYMBOLS
+from writers.parquet_writer import ParquetWriter
+
+VENUES = ["binance", "hyperliquid", "polymarket"]
+
+CODECS = [
+    ("zstd", 1),
+    ("zstd", 3),
+    ("zstd", 9),
+    ("zstd", 19),
+    ("lz4", None),
+    ("snappy", None),
+    ("gzip", 6),
+    ("uncompressed", None),
+]
+BUFFER_SIZES = [1e3, 1e4, 1e5]
+ROW_GROUP_SIZES = [None, 1e3, 1e4]
+LAYOUTS = ["wide", "nested"]
+
+
+@dataclass
+class Case:
+    venue: str
+    layout: str = "wide"
+    compression: str = "zstd"
+    compression_level: int | None = None
+    buffer_size: float = 1e4
+    row_group_size: float | None = None
+    statistics: bool = True
+    categorical: bool = False
+    symbols: bool = False  # rows carry SYMBOLS ids and interned names
+
+
+@dataclass
+class Result:
+    rows: int
+    files: int
+    write_seconds: float
+    rows_per_second: float
+    bytes_on_disk: int
+    bytes_per_row: float
+    row_mb: float  # held by the rows themselves, as buffered by the writer
+    peak_write_mb: float  # Python heap the writer held on top of the rows, at most
+    full_scan_seconds: float
+    projected_scan_seconds: float
+    filtered_scan_seconds: float
+
+
+def _random_walk(n: int, start: float, step: float, low: float, high: float):
+    price = start
+    for _ in range(n):
+        price = min(max(price + random.gauss(0, step), low), high)
+        yield price
+
+
+def _book_levels(mid: float, tick: float, levels: int, low: float, high: float):
+    bids = {}
+    asks = {}
+    for i in range(levels):
+        bids |= {
+            f"bid_{i + 1}_price": round(max(mid - (i + 1) * tick, low), 6),
+            f"bid_{i + 1}_size": round(random.expovariate(1 / 500), 2),
+        }
+        asks |= {
+            f"ask_{i + 1}_price": round(min(mid + (i + 1) * tick, high), 6),
+            f"ask_{i + 1}_size": round(random.expovariate(1 / 500), 2),
+        }
+    return bids | asks
+
+
+def synthetic_binance_rows(n: int) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "timestamp": now + timedelta(microseconds=i * 200),
+            "asset_name": "BTCUSDT",
+            "bid_price": round(mid - 0.005, 2),
+            "bid_size": round(random.expovariate(1 / 2), 5),
+            "ask_price": round(mid + 0.005, 2),
+            "ask_size": round(random.expovariate(1 / 2), 5),
+        }
+        for i, mid in enumerate(_random_walk(n, 100_000, 1.5, 1, 1e7))
+    ]
+
+
+def synthetic_hyperliquid_rows(n: int, levels: int = 10) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "timestamp": now + timedelta(milliseconds=i * 500 + 80),
+            "exchange_timestamp": now + timedelta(milliseconds=i * 500),
+            "asset_name": "BTC",
+        }
+        | _book_levels(round(mid), 1, levels, 1, 1e7)
+        for i, mid in enumerate(_random_walk(n, 100_000, 5, 1, 1e7))
+    ]
+
+
+def synthetic_polymarket_rows(n: int, levels: int = 5) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    tokens = [
+        ("Up", "".join(random.choices("0123456789", k=77))),
+        ("Down", "".join(random.choices("0123456789", k=77))),
+    ]
+    rows = []
+    for i, mid in enumerate(_random_walk(n, 0.5, 0.002, 0.02, 0.98)):
+        token_name, token_id = tokens[i % 2]
+        rows.append(
+            {
+                "timestamp": now + timedelta(milliseconds=i * 20 + 40),
+                "exchange_timestamp": now + timedelta(milliseconds=i * 20),
+                "asset_id": token_id,
+                "asset_name": token_name,
+                "event_type": "price_change" if i % 50 else "book",
+            }
+            | _book_levels(
+                round(mid if token_name == "Up" else 1 - mid, 2), 0.01, levels, 0, 1
+            )
+        )
+    return rows
+
+
+SYNTHETIC_STREAMS = {
+    "binance": synthetic_binance_rows,
+    "hyperliquid": synthetic_hyperliquid_rows,
+    "polymarket": synthetic_polymarket_rows,
+}
+
+
+def recorded_rows(paths: list[str], venue: str, n: int) -> list[dict]:
+    frames = [
+        pl.scan_parquet(p)
+        for p in paths
+        if infer_venue(pl.scan_parquet(p).collect_schema()) == venue
+    ]
+    if not frames:
+        return []
+
+    return pl.concat(frames, how="diagonal").head(n).collect().to_dicts()
+
+
+def to_nested(row: dict) -> dict:
+    nested = {
+        k: v
+        for k, v in row.items()
+        if not (k.startswith("bid_") or k.startswith("ask_"))
+    }
+    for side in ["bid", "ask"]:
+        levels = []
+        i = 1
+        while f"{side}_{i}_price" in row:
+            levels.append(
+                {"price": row[f"{side}_{i}_price"], "size": row[f"{side}_{i}_size"]}
+            )
+            i += 1
+
+        if levels:
+            nested[f"{side}s"] = levels
+        elif f"{side}_price" in row:
+            nested[f"{side}s"] = [
+                {"price": row[f"{side}_price"], "size": row[f"{side}_size"]}
+            ]
+
+    return nested
+
+
+def _parsed(row: dict) -> dict:
+    # a row built from a parsed message holds its own copy of every string
+    return {k: v.encode().decode() if isinstance(v, str) else v for k, v in row.items()}
+
+
+def _with_symbols(row: dict) -> dict:
+    ids = {c: SYMBOLS.id_of(row[c]) for c in SYMBOL_COLUMNS if c in row}
+    return row | ids | {"asset_name": SYMBOLS.intern(row["asset_name"])}
+
+
+def _write(case: Case, rows: list[dict], output_dir: str):
+    writer = ParquetWriter(
+        buffer_size=case.buffer_size,
+        compression=case.compression,
+        compression_level=case.compression_level,
+        row_group_size=case.row_group_size,
+        statistics=case.statistics,
+        categorical_columns=(
+            ("asset_name", "asset_id", "event_type") if case.categorical else ()
+        ),
+        output_dir=output_dir,
+        progress=False,
+        # the process-wide budget would flush early and outlive the case
+        memory_budget=None,
+    )
+    for row in rows:
+        writer.write(data_type="orderbook", data=row)
+    writer.flush()
+
+
+def _peak_write_mb(case: Case, rows: list[dict]) -> float:
+    # a second, untimed write, tracing slows the first down. ru_maxrss would only
+    # be the process's high-water mark, likely set while the rows were built
+    output_dir = tempfile.mkdtemp(prefix="writer-benchmark-")
+    try:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        _write(case, rows, output_dir)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return (peak - before) / 2**20
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def _time_scan(frame: pl.LazyFrame) -> float:
+    start = time.perf_counter()
+    frame.collect()
+    return time.perf_counter() - start
+
+
+def run_case(case: Case, rows: list[dict]) -> Result:
+    tracemalloc.start()
+    rows = [_with_symbols(r) if case.symbols else _parsed(r) for r in rows]
+    row_mb = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+
+    if case.layout == "nested":
+        rows = [to_nested(r) for r in rows]
+
+    output_dir = tempfile.mkdtemp(prefix="writer-benchmark-")
+    try:
+        start = time.perf_counter()
+        _write(case, rows, output_dir)
+        write_seconds = time.perf_counter() - start
+
+        files = glob.glob(os.path.join(output_dir, "*.parquet"))
+        bytes_on_disk = sum(os.path.getsize(f) for f in files)
+
+        scan = pl.scan_parquet(files)
+        schema = scan.collect_schema()
+        price_column = "bid_1_price" if "bid_1_price" in schema else "bid_price"
+        if price_column not in schema:
+            price_column = "bids"
+
+        return Result(
+            rows=len(rows),
+            files=len(files),
+            write_seconds=write_seconds,
+            rows_per_second=len(rows) / write_seconds,
+            bytes_on_disk=bytes_on_disk,
+            bytes_per_row=bytes_on_disk / len(rows),
+            row_mb=row_mb,
+            peak_write_mb=_peak_write_mb(case, rows),
+            full_scan_seconds=_time_scan(scan),
+            projected_scan_seconds=_time_scan(scan.select("timestamp", price_column)),
+            filtered_scan_seconds=_time_scan(
+                scan.filter(
+                    pl.col("timestamp")
+                    >= pl.col("timestamp").max() - pl.duration(seconds=1)
+                )
+            ),
+        )
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def _run_case_in_child(case: Case, rows_per_stream: int, recorded: list[str]) -> dict:
+    # each case runs in a fresh process, no writer state or cached symbols carry over
+    random.seed(0)
+    rows = recorded_rows(recorded, case.venue, rows_per_stream) if recorded else []
+    if not rows:
+        rows = SYNTHETIC_STREAMS[case.venue](rows_per_stream)
+
+    return asdict(case) | asdict(run_case(case, rows))
+
+
+def build_cases(venues: list[str], full_grid: bool) -> list[Case]:
+    if full_grid:
+        return [
+            Case(
+                venue=v,
+                layout=layout,
+                compression=codec,
+                compression_level=level,
+                buffer_size=buffer_size,
+                row_group_size=row_group_size,
+                statistics=statistics,
+                categorical=categorical,
+            )
+            for v, layout, (codec, level), buffer_size, row_group_size, statistics, categorical in itertools.product(
+                venues,
+                LAYOUTS,
+                CODECS,
+                BUFFER_SIZES,
+                ROW_GROUP_SIZES,
+                [True, False],
+                [True, False],
+            )
+        ]
+
+    # vary one dimension at a time around the current defaults
+    cases = []
+    for v in venues:
+        baseline = Case(venue=v)
+        cases.append(baseline)
+        cases += [
+            replace(baseline, compression=codec, compression_level=level)
+            for codec, level in CODECS
+            if (codec, level) != ("zstd", None)
+        ]
+        cases += [
+            replace(baseline, buffer_size=b)
+            for b in BUFFER_SIZES
+            if b != baseline.buffer_size
+        ]
+        cases += [
+            replace(baseline, row_group_size=r) for r in ROW_GROUP_SIZES if r
+        ]
+        cases.append(replace(baseline, statistics=False))
+        cases.append(replace(baseline, categorical=True))
+        cases.append(replace(baseline, symbols=True))
+        cases.append(replace(baseline, layout="nested"))
+
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ParquetWriter codecs and layouts."
+    )
+    parser.add_argument("--venues", nargs="+", choices=VENUES, default=VENUES)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument(
+        "--recorded",
+        nargs="*",
+        default=[],
+        help="captured Parquet files to replay instead of synthetic rows",
+    )
+    parser.add_argument(
+        "--full-grid",
+        action="store_true",
+        help="run the full cartesian product instead of one factor at a time",
+    )
+    parser.add_argument("--output", help="write results to this CSV file")
+    args = parser.parse_args()
+
+    recorded = [p for pattern in args.recorded for p in glob.glob(pattern)]
+    cases = build_cases(args.venues, args.full_grid)
+    logger.info("Running {} writer benchmark cases", len(cases))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+        for case, result in zip(
+            cases,
+            executor.map(
+                _run_case_in_child,
+                cases,
+                itertools.repeat(args.rows),
+                itertools.repeat(recorded),
+            ),
+        ):
+            logger.info(
+                "{}: {:.0f} rows/s, {:.1f} B/row",
+                case,
+                result["rows_per_second"],
+                result["bytes_per_row"],
+            )
+            results.append(result)
+
+    results = pl.DataFrame(results).sort("venue", "bytes_per_row")
+    with pl.Config(tbl_rows=-1, tbl_cols=-1, tbl_width_chars=250):
+        print(results)
+
+    if args.output:
+        results.write_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
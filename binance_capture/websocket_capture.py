@@ -4,49 +4,78 @@ import json
 from datetime import datetime, timezone
 
 from binance.websocket.spot.websocket_stream import SpotWebsocketStreamClient
+from bus.event_bus import EVENT_BUS
 from config_manager import load_logging_config
+from constants import BINANCE_WSS_URL
 from loguru import logger
-from writers.parquet_writer import ParquetWriter
+from profiling import PROFILER
+from symbols import SYMBOLS
+from tracing import TRACER
+from writers.venue_writer import VenueWriter
+
+
+VENUE = "binance"
+
+
+class StreamClient(SpotWebsocketStreamClient):
+    def is_alive(self) -> bool:
+        # the socket manager's read loop ends when the connection drops, Binance
+        # closes every connection after 24 hours
+        return self.socket_manager.is_alive()
 
 
 class WebsocketOrderBookCapture:
-    def __init__(self):
-        self.writer = ParquetWriter(buffer_size=1e4)
+    def __init__(self, writer: VenueWriter | None = None):
+        # a writer passed in is shared with other connections and closed by its owner
+        self.owns_writer = writer is None
+        self.writer = writer or VenueWriter(VENUE, buffer_size=1e4)
 
     def on_close(self, _):
         logger.debug("Closing connection.")
 
-        del (
-            self.writer
-        )  # manually flush contents (avoids weird python edge case where program dies before writer)
+        if self.owns_writer:
+            self.writer.close()
 
-        exit(0)
+    def on_error(self, _, error: Exception):
+        logger.error("Error: {}", error)
+        TRACER.dump(f"{VENUE} error: {error}")
 
     def on_book_ticker(self, _, message: str):
         if "result" not in message:
-            logger.debug("Got message: {}", message)
-            message = json.loads(message)
-            self.writer.write(
-                data_type="orderbook",
-                data={
-                    "timestamp": datetime.now(timezone.utc),
-                    "asset_name": message["s"],
-                    "bid_price": float(message["b"]),
-                    "bid_size": float(message["B"]),
-                    "ask_price": float(message["a"]),
-                    "ask_size": float(message["A"]),
-                },
-            )
+            TRACER.record(VENUE, message)
+            with PROFILER.stage(VENUE, "decode"):
+                message = json.loads(message)
+
+            if TRACER.enabled and TRACER.sample(VENUE, message["s"]):
+                TRACER.trace("Got message: {}", message)
+
+            row = {
+                "timestamp": datetime.now(timezone.utc),
+                "asset_name": SYMBOLS.intern(message["s"]),
+                "update_id": message["u"],  # the order book update, as exchange key
+                "bid_price": float(message["b"]),
+                "bid_size": float(message["B"]),
+                "ask_price": float(message["a"]),
+                "ask_size": float(message["A"]),
+            }
+            with PROFILER.stage(VENUE, "publish"):
+                EVENT_BUS.publish(VENUE, "orderbook", row)
 
 
 @logger.catch
-def run_capture() -> SpotWebsocketStreamClient:
-    client = WebsocketOrderBookCapture()
-    binance_connection = SpotWebsocketStreamClient(
-        on_message=client.on_book_ticker, on_close=client.on_close
+def run_capture(
+    url=BINANCE_WSS_URL, symbols=("btcusdt",), writer: VenueWriter | None = None
+) -> StreamClient:
+    client = WebsocketOrderBookCapture(writer)
+    binance_connection = StreamClient(
+        stream_url=url,
+        on_message=client.on_book_ticker,
+        on_close=client.on_close,
+        on_error=client.on_error,
     )
 
-    binance_connection.book_ticker(symbol="btcusdt")
+    # one SUBSCRIBE for all streams, Binance limits incoming messages per connection
+    binance_connection.subscribe([f"{s.lower()}@bookTicker" for s in symbols])
 
     return binance_connection
 
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import socket
+from typing import Iterator
+
+from bus.codec import Decoder, read_frame
+from constants import BUS_SOCKET_PATH
+
+
+def subscribe(
+    path=BUS_SOCKET_PATH, venues=None, data_types=None, conflate=(), max_pending=None
+) -> Iterator[tuple[str, str, dict]]:
+    request = {"venues": venues, "data_types": data_types, "conflate": list(conflate)}
+    if max_pending:
+        request["max_pending"] = max_pending
+
+    decoder = Decoder()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+
+        while (frame := read_frame(sock)) is not None:
+            event = decoder.decode(frame)
+            if event is not None:
+                yield event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print events from the capture bus.")
+    parser.add_argument("--path", default=BUS_SOCKET_PATH)
+    parser.add_argument("--venues", nargs="*")
+    parser.add_argument("--data-types", nargs="*")
+    parser.add_argument("--conflate", nargs="*", default=[])
+    args = parser.parse_args()
+
+    for venue, data_type, data in subscribe(
+        args.path, args.venues, args.data_types, args.conflate
+    ):
+        print(venue, data_type, data)
+
+
+if __name__ == "__main__":
+    main()
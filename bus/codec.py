@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+import struct
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Frames are length prefixed. A schema frame describes the columns of a row shape
+# once per connection, data frames then only carry the schema id and packed values.
+#
+#   frame   := u32 length, u8 kind, body
+#   schema  := u16 schema id, str venue, str data type, u16 columns, (u8 type, str name)*
+#   data    := u16 schema id, values packed according to the schema
+#   str     := u16 length, utf-8 bytes
+
+SCHEMA = 1
+DATA = 2
+
+FLOAT = ord("d")
+INT = ord("q")
+BOOL = ord("?")
+TIMESTAMP = ord("t")  # int64 microseconds since the epoch, UTC
+STRING = ord("s")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+_header = struct.Struct("<IB")
+_length = struct.Struct("<I")
+_u16 = struct.Struct("<H")
+_float = struct.Struct("<d")
+_int = struct.Struct("<q")
+_bool = struct.Struct("<?")
+
+
+def _type_of(value) -> int:
+    match value:
+        case bool():
+            return BOOL
+        case int():
+            return INT
+        case float() | None:
+            return FLOAT
+        case datetime():
+            return TIMESTAMP
+        case _:
+            return STRING
+
+
+def _pack_str(s: str) -> bytes:
+    b = s.encode()
+    return _u16.pack(len(b)) + b
+
+
+def _unpack_str(buffer: memoryview, offset: int) -> tuple[str, int]:
+    (n,) = _u16.unpack_from(buffer, offset)
+    offset += _u16.size
+    return bytes(buffer[offset : offset + n]).decode(), offset + n
+
+
+def _frame(kind: int, body: bytes) -> bytes:
+    return _header.pack(len(body) + 1, kind) + body
+
+
+def _micros(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+class Encoder:
+    def __init__(self):
+        self.schemas = {}  # (venue, data_type, columns) -> schema id
+        self.schema_frames = []
+        self.lock = threading.Lock()
+
+    def schema_frame(self, schema_id: int) -> bytes:
+        return self.schema_frames[schema_id]
+
+    def _schema_id(self, venue: str, data_type: str, data: dict) -> int:
+        columns = tuple((k, _type_of(v)) for k, v in data.items())
+        key = (venue, data_type, columns)
+        schema_id = self.schemas.get(key)
+        if schema_id is not None:
+            return schema_id
+
+        with self.lock:
+            schema_id = self.schemas.get(key)
+            if schema_id is not None:
+                return schema_id
+
+            schema_id = len(self.schema_frames)
+            self.schema_frames.append(
+                _frame(
+                    SCHEMA,
+                    _u16.pack(schema_id)
+                    + _pack_str(venue)
+                    + _pack_str(data_type)
+                    + _u16.pack(len(columns))
+                    + b"".join(bytes([t]) + _pack_str(k) for k, t in columns),
+                )
+            )
+            self.schemas[key] = schema_id
+            return schema_id
+
+    def encode(self, venue: str, data_type: str, data: dict) -> tuple[int, bytes]:
+        schema_id = self._schema_id(venue, data_type, data)
+        body = [_u16.pack(schema_id)]
+        for v in data.values():
+            match v:
+                case bool():
+                    body.append(_bool.pack(v))
+                case int():
+                    body.append(_int.pack(v))
+                case float():
+                    body.append(_float.pack(v))
+                case None:
+                    body.append(_float.pack(float("nan")))
+                case datetime():
+                    body.append(_int.pack(_micros(v)))
+                case _:
+                    body.append(_pack_str(str(v)))
+
+        return schema_id, _frame(DATA, b"".join(body))
+
+
+class Decoder:
+    def __init__(self):
+        self.schemas = {}  # schema id -> (venue, data_type, columns)
+
+    def decode(self, frame: bytes) -> tuple[str, str, dict] | None:
+        buffer = memoryview(frame)
+        kind = buffer[0]
+        offset = 1
+        (schema_id,) = _u16.unpack_from(buffer, offset)
+        offset += _u16.size
+
+        if kind == SCHEMA:
+            venue, offset = _unpack_str(buffer, offset)
+            data_type, offset = _unpack_str(buffer, offset)
+            (n,) = _u16.unpack_from(buffer, offset)
+            offset += _u16.size
+            columns = []
+            for _ in range(n):
+                t = buffer[offset]
+                name, offset = _unpack_str(buffer, offset + 1)
+                columns.append((name, t))
+            self.schemas[schema_id] = (venue, data_type, columns)
+            return None
+
+        venue, data_type, columns = self.schemas[schema_id]
+        data = {}
+        for name, t in columns:
+            if t == FLOAT:
+                (data[name],) = _float.unpack_from(buffer, offset)
+                offset += _float.size
+            elif t == TIMESTAMP:
+                (micros,) = _int.unpack_from(buffer, offset)
+                data[name] = EPOCH + timedelta(microseconds=micros)
+                offset += _int.size
+            elif t == INT:
+                (data[name],) = _int.unpack_from(buffer, offset)
+                offset += _int.size
+            elif t == BOOL:
+                (data[name],) = _bool.unpack_from(buffer, offset)
+                offset += _bool.size
+            else:
+                data[name], offset = _unpack_str(buffer, offset)
+
+        return venue, data_type, data
+
+
+def read_frame(sock) -> bytes | None:
+    header = _recv_exactly(sock, _length.size)
+    if header is None:
+        return None
+
+    (length,) = _length.unpack(header)
+    return _recv_exactly(sock, length)
+
+
+def _recv_exactly(sock, n: int) -> bytes | None:
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+
+    return b"".join(chunks)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+from loguru import logger
+
+Callback = Callable[[str, str, dict], None]
+
+
+@dataclass(eq=False)
+class Subscription:
+    callback: Callback
+    venues: frozenset | None = None
+    data_types: frozenset | None = None
+
+    def matches(self, venue: str, data_type: str) -> bool:
+        return (self.venues is None or venue in self.venues) and (
+            self.data_types is None or data_type in self.data_types
+        )
+
+
+class EventBus:
+    def __init__(self):
+        self.subscriptions = []
+        self.routes = {}  # cached subscriptions per (venue, data_type)
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback: Callback, venues=None, data_types=None) -> Subscription:
+        subscription = Subscription(
+            callback=callback,
+            venues=frozenset(venues) if venues is not None else None,
+            data_types=frozenset(data_types) if data_types is not None else None,
+        )
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+            self.routes = {}
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+            self.routes = {}
+
+    def _route(self, venue: str, data_type: str) -> list[Subscription]:
+        with self.lock:
+            route = [s for s in self.subscriptions if s.matches(venue, data_type)]
+            self.routes[(venue, data_type)] = route
+            return route
+
+    def publish(self, venue: str, data_type: str, data: dict):
+        route = self.routes.get((venue, data_type))
+        if route is None:
+            route = self._route(venue, data_type)
+
+        for subscription in route:
+            try:
+                subscription.callback(venue, data_type, data)
+            except Exception as e:
+                # one failing consumer must not stop the capture or the other consumers
+                logger.exception("Subscriber {} failed: {}", subscription.callback, e)
+
+
+EVENT_BUS = EventBus()
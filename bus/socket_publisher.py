@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+import json
+import os
+import socket
+import threading
+from collections import OrderedDict
+
+from loguru import logger
+
+from bus.codec import Encoder
+from bus.event_bus import EVENT_BUS, EventBus
+from symbols import SYMBOLS
+
+# pending frames per consumer before it counts as behind
+MAX_PENDING = 10_000
+
+
+class Consumer:
+    def __init__(self, connection: socket.socket, request: dict):
+        self.connection = connection
+        self.venues = set(request["venues"]) if request.get("venues") else None
+        self.data_types = (
+            set(request["data_types"]) if request.get("data_types") else None
+        )
+        # data types that may be conflated to the latest value per asset when behind
+        self.conflate = set(request.get("conflate", []))
+        self.max_pending = request.get("max_pending", MAX_PENDING)
+        self.pending = OrderedDict()
+        self.sent_schemas = set()
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.conflated = 0
+        self.dropped = 0
+        self.delivered = 0
+
+    def wants(self, venue: str, data_type: str) -> bool:
+        return (self.venues is None or venue in self.venues) and (
+            self.data_types is None or data_type in self.data_types
+        )
+
+    def offer(self, venue: str, data_type: str, data: dict, schema_id: int, frame: bytes):
+        with self.condition:
+            behind = len(self.pending) >= self.max_pending
+            if data_type in self.conflate:
+                key = (venue, data_type, data.get("asset_name"))
+                if key in self.pending:
+                    # replaces the stale update in place, keeping its position in the queue
+                    self.pending[key] = (schema_id, frame)
+                    self.conflated += 1
+                    return
+            else:
+                key = self.sequence
+                self.sequence += 1
+
+            if behind:
+                self.pending.popitem(last=False)
+                self.dropped += 1
+
+            self.pending[key] = (schema_id, frame)
+            self.condition.notify()
+
+    def run(self, encoder: Encoder):
+        try:
+            while True:
+                with self.condition:
+                    while not self.pending and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+
+                    batch = list(self.pending.values())
+                    self.pending.clear()
+
+                frames = []
+                for schema_id, frame in batch:
+                    if schema_id not in self.sent_schemas:
+                        frames.append(encoder.schema_frame(schema_id))
+                        self.sent_schemas.add(schema_id)
+                    frames.append(frame)
+
+                self.connection.sendall(b"".join(frames))
+                self.delivered += len(batch)
+        except OSError as e:
+            logger.info("Consumer disconnected: {}", e)
+        finally:
+            self.close()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+        self.connection.close()
+
+
+class UnixSocketPublisher:
+    def __init__(self, path: str, bus: EventBus = EVENT_BUS):
+        self.path = path
+        self.bus = bus
+        self.encoder = Encoder()
+        self.consumers = []
+        self.subscription = None
+        self.server = None
+        self.thread = None
+
+    def _on_event(self, venue: str, data_type: str, data: dict):
+        consumers = [c for c in self.consumers if c.wants(venue, data_type)]
+        if not consumers:
+            return
+
+        # consumers in other processes get strings, they cannot look ids up
+        data = SYMBOLS.decode(data)
+        schema_id, frame = self.encoder.encode(venue, data_type, data)
+        for consumer in consumers:
+            consumer.offer(venue, data_type, data, schema_id, frame)
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+
+            # consumers open with a single JSON line describing what they want
+            request = json.loads(connection.makefile("rb").readline() or b"{}")
+            consumer = Consumer(connection, request)
+            logger.info("New bus consumer {}", request)
+
+            self.consumers = [c for c in self.consumers if not c.closed] + [consumer]
+            threading.Thread(
+                target=consumer.run, args=(self.encoder,), daemon=True
+            ).start()
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen()
+        self.subscription = self.bus.subscribe(self._on_event)
+        self.thread = threading.Thread(target=self._accept, daemon=True)
+        self.thread.start()
+        logger.info("Publishing events on {}", self.path)
+
+    def stop(self):
+        self.bus.unsubscribe(self.subscription)
+        self.server.close()
+        for consumer in self.consumers:
+            consumer.close()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def stats(self) -> list[dict]:
+        return [
+            {
+                "venues": c.venues,
+                "data_types": c.data_types,
+                "pending": len(c.pending),
+                "delivered": c.delivered,
+                "conflated": c.conflated,
+                "dropped": c.dropped,
+            }
+            for c in self.consumers
+        ]
@@ -2,164 +2,438 @@
 
 import json
 import os
-import shutil
 import signal
 import threading
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
 
 from loguru import logger
 
-from binance_capture.websocket_capture import run_capture as run_binance_capture
+from bus.socket_publisher import UnixSocketPublisher
+from capture_plan import (
+    HYPERLIQUID_SUBSCRIPTION_LIMIT,
+    CapturePlan,
+    VenuePlan,
+    check_hyperliquid_subscriptions,
+    load_capture_plan,
+)
 from config_manager import load_logging_config
-from hyperliquid_capture.websocket_capture import run_capture as run_hyperliquid_capture
-from polymarket.websocket_capture import run_capture as run_polymarket_capture
+from constants import BUS_SOCKET_PATH, FEATURES_ENABLED, STAGING_DIRECTORY
+from profiling import PROFILER
+from symbols import SYMBOLS
+from tracing import TRACER
 from utils import get_binance_target_price, get_hyperliquid_target_price
-
-binance_connection = None
-polymarket_connection = None
-hyperliquid_connection = None
+from writers.venue_writer import VenueWriter, close_pipeline
+
+# venue modules (binance-connector, the pydantic parsers, pyarrow, the features stage)
+# are imported when a plan first needs them, startup only pays for what is captured
+
+TARGET_PRICES = {
+    "binance": get_binance_target_price,
+    "hyperliquid": get_hyperliquid_target_price,
+}
+PREWARM_SECONDS = 60  # the next hour's Polymarket markets are looked up this early
+# time for events already inside a replaced writer to finish before it is closed
+ROTATION_GRACE_SECONDS = 0.5
+# how often dropped connections are looked for, none of the venue clients reconnect
+CONNECTION_CHECK_SECONDS = 10
+
+plan: CapturePlan | None = None
+# venue -> (VenuePlan, [(connection, connect)]), every connection has a stop() and
+# an is_alive(), connect opens a replacement
+running = {}
+starting = []  # threads starting venue connections
+venue_writers = {}  # venue -> VenueWriter shared by the venue's connections
+connections_lock = threading.Lock()
 market_info = None
+prewarmed_market_infos = None
+rotation = threading.Event()
 terminate = False
-timing_thread = None
 target_thread = None
+prewarm_thread = None
+bus_publisher = None
+feature_stage = None
 
 
 def signal_handler(sig_num, _):
-    assert timing_thread is not None
-    timing_thread.cancel()
-
-    assert target_thread is not None
-    target_thread.cancel()
-
-    global binance_connection
-    if binance_connection is not None:
-        logger.debug("Closing binance connection.")
-        binance_connection.stop()
-    else:
-        logger.warning("Binance connection not found!")
-
-    global hyperliquid_connection
-    if hyperliquid_connection is not None:
-        logger.debug("Closing hyperliquid connection.")
-        hyperliquid_connection.stop()
-    else:
-        logger.warning("Hyperliquid connection not found!")
-
-    global polymarket_connection
-    if polymarket_connection is not None:
-        logger.debug("Closing polymarket connection.")
-        polymarket_connection.stop()
-    else:
-        logger.warning("Polymarket connection not found!")
-
+    # only flags the main loop, which rotates or shuts down outside the handler
     global terminate
-    if sig_num != signal.SIGUSR1 or terminate:
+    if sig_num != signal.SIGUSR1:
         terminate = True
         logger.info("Signal received to terminate")
     else:
-        assert not terminate
-        logger.info("Signal received to re-run")
+        logger.info("Signal received to rotate")
+    rotation.set()
 
-    # move any parquets to their own slug directory based on market_info
-    parquet_files = [e for e in os.listdir("./") if e.endswith(".parquet")]
-    if market_info and parquet_files:
-        slug_directory = f"data/{market_info.slug}/"
-        os.makedirs(slug_directory, exist_ok=True)
 
-        for parquet_file in parquet_files:
-            shutil.move(parquet_file, slug_directory)
+def _add_connection(venue: str, connect):
+    connection = connect()
+    if connection is None:  # run_capture logged the failure
+        return
 
-        logger.info("Parquet files moved to '{}'.", slug_directory)
+    with connections_lock:
+        running[venue][1].append((connection, connect))
+    logger.debug("Got {} connection {}", venue, connection)
 
-        # move targets file
-        shutil.move("targets.json", slug_directory)
 
-    # continue running
-    if not terminate:
-        logger.debug("Rerunning")
-        main()
+def _stop_venue(venue: str):
+    with connections_lock:
+        _, connections = running.pop(venue)
 
+    if not connections:
+        logger.warning("No {} connections found!", venue)
+    for connection, _ in connections:
+        logger.debug("Closing {} connection.", venue)
+        connection.stop()
 
-def run_binance_capture_thread():
-    global binance_connection
-    binance_connection = run_binance_capture()
-    logger.debug("Got binance_connection {}", binance_connection)
 
+def _restart_dropped_connections():
+    # only the main loop stops venues, so a venue found here is still running
+    with connections_lock:
+        dropped = [
+            (venue, i, connection, connect)
+            for venue, (_, connections) in running.items()
+            for i, (connection, connect) in enumerate(connections)
+            if not connection.is_alive()
+        ]
 
-def run_hyperliquid_capture_thread():
-    global hyperliquid_connection
-    hyperliquid_connection = run_hyperliquid_capture()
-    logger.debug("Got hyperliquid_connection {}", hyperliquid_connection)
+    for venue, i, connection, connect in dropped:
+        logger.warning("{} connection {} dropped, reconnecting", venue, connection)
+        connection.stop()
+        replacement = connect()
+        if replacement is None:  # tried again on the next check
+            continue
 
+        with connections_lock:
+            running[venue][1][i] = (replacement, connect)
 
-def run_polymarket_capture_thread():
-    global polymarket_connection, market_info
-    polymarket_connection, market_info = run_polymarket_capture()
-    logger.debug("Got polymarket_connection {}", polymarket_connection)
 
+def _levels(venue_plan: VenuePlan, default: int) -> int:
+    return venue_plan.depth if venue_plan.depth is not None else default
 
-def fire_interrupt():
-    logger.info("Firing signal to interrupt.")
-    pid = os.getpid()
-    os.kill(pid, signal.SIGUSR1)
 
+@logger.catch
+def run_venue_capture_thread(venue_plan: VenuePlan, writer: VenueWriter):
+    match venue_plan.venue:
+        case "binance":
+            from binance_capture.websocket_capture import run_capture
+
+            for shard in venue_plan.shards(venue_plan.symbols):
+                _add_connection(
+                    "binance", partial(run_capture, venue_plan.url, shard, writer)
+                )
+        case "hyperliquid":
+            from hyperliquid_capture.websocket_capture import Channel, run_capture
+            from utils import get_hyperliquid_perps
+
+            coins = venue_plan.symbols
+            if coins == ["*"]:
+                coins = get_hyperliquid_perps()
+                logger.info("Capturing {} Hyperliquid perps", len(coins))
+                try:
+                    check_hyperliquid_subscriptions(venue_plan, len(coins))
+                except ValueError as e:
+                    # over the limit the venue closes connections, keep what fits
+                    coins = coins[
+                        : HYPERLIQUID_SUBSCRIPTION_LIMIT
+                        // venue_plan.subscriptions_per_symbol()
+                    ]
+                    logger.error("{}, capturing only the first {}", e, len(coins))
+
+            channels = [Channel(c) for c in venue_plan.channels]
+            books = [c for c in channels if c == Channel.MARKET_CHANNEL]
+            others = [c for c in channels if c != Channel.MARKET_CHANNEL]
+            tag_aggregation = len(venue_plan.n_sig_figs) > 1
+
+            # l2Book updates do not carry their nSigFigs, so every aggregation level
+            # gets its own connections, trades and bbo ride on the first level's
+            for i, n_sig_figs in enumerate(venue_plan.n_sig_figs):
+                level_channels = books + (others if i == 0 else [])
+                if not level_channels:
+                    continue
+
+                for shard in venue_plan.shards(coins, len(level_channels)):
+                    connect = partial(
+                        run_capture,
+                        venue_plan.url,
+                        shard,
+                        n_sig_figs,
+                        _levels(venue_plan, 10),
+                        writer,
+                        level_channels,
+                        tag_aggregation,
+                    )
+                    _add_connection("hyperliquid", connect)
+        case "polymarket":
+            from polymarket.market_info import get_hourly_market_infos
+
+            global market_info, prewarmed_market_infos
+            market_infos, prewarmed_market_infos = prewarmed_market_infos, None
+            if market_infos is None:
+                market_infos = get_hourly_market_infos(venue_plan.symbols)
+            market_info = market_infos[0]  # names the slug directory
+
+            tokens = [t for m in market_infos for t in m.tokens]
+            for shard in venue_plan.shards(tokens):
+                _add_connection(
+                    "polymarket",
+                    partial(
+                        _run_polymarket,
+                        venue_plan.url,
+                        shard,
+                        _levels(venue_plan, 5),
+                        writer,
+                    ),
+                )
+
+
+def _run_polymarket(url: str, tokens: list, levels: int, writer: VenueWriter):
+    from polymarket.websocket_capture import (
+        Channel,
+        WebsocketOrderBookCapture,
+        get_auth,
+    )
+
+    connection = WebsocketOrderBookCapture(
+        Channel.MARKET_CHANNEL, url, tokens, get_auth(), levels, writer
+    )
+    connection.run()
+    return connection
 
-def output_targets():
-    binance_target = get_binance_target_price("BTCUSDT")
-    hyperliquid_target = get_hyperliquid_target_price("BTC")
 
-    with open("targets.json", "w") as f:
-        json.dump(
-            {
-                "binance_target": binance_target,
-                "hyperliquid_target": hyperliquid_target,
-            },
-            f,
-            indent=4,
+@logger.catch
+def prewarm_markets(at: datetime):
+    # takes the market lookup off the rotation, which then only has to connect
+    global prewarmed_market_infos
+    venue_plan = plan.venues.get("polymarket")
+    if venue_plan is None:
+        return
+
+    from polymarket.market_info import get_hourly_market_infos
+
+    prewarmed_market_infos = get_hourly_market_infos(venue_plan.symbols, at)
+    logger.info("Prewarmed Polymarket market {}", prewarmed_market_infos[0].slug)
+
+
+def start_hour(staging_directory: str) -> list:
+    """Applies the plan for the coming hour, returns the replaced writer pipelines.
+
+    Connections whose venue plan is unchanged keep running across rotations, only
+    the writers behind them are replaced. Polymarket markets are hourly, so its
+    connections are always replaced.
+    """
+    global plan
+    try:
+        plan = load_capture_plan()
+    except Exception as e:
+        if plan is None:
+            raise
+        # a bad edit of a running plan must not stop the capture, nor leave the
+        # finished hour in staging
+        logger.error("Keeping the current capture plan, the new one failed: {}", e)
+    os.makedirs(staging_directory, exist_ok=True)
+
+    for t in starting:
+        t.join()
+    starting.clear()
+
+    for venue, (venue_plan, _) in list(running.items()):
+        if venue == "polymarket" or plan.venues.get(venue) != venue_plan:
+            _stop_venue(venue)
+
+    for venue in [v for v in venue_writers if v not in plan.venues]:
+        venue_writers.pop(venue).close()
+
+    retired = []
+    for venue, venue_plan in plan.venues.items():
+        writer_options = venue_plan.flush | {"output_dir": staging_directory}
+        if venue in venue_writers:
+            retired.append(
+                venue_writers[venue].rotate(plan.output_format, **writer_options)
+            )
+        else:
+            venue_writers[venue] = VenueWriter(
+                venue, plan.output_format, **writer_options
+            )
+
+        if venue not in running:
+            running[venue] = (venue_plan, [])
+            starting.append(
+                threading.Thread(
+                    target=run_venue_capture_thread,
+                    args=(venue_plan, venue_writers[venue]),
+                    name=f"start-{venue}",
+                )
+            )
+            starting[-1].start()
+
+    return retired
+
+
+def _move(staging_directory: str, file: str, output_directory: str):
+    from analysis.datasets import FILE_PATTERN, next_seq_no
+
+    destination = os.path.join(output_directory, file)
+    match = FILE_PATTERN.match(file)
+    if match and os.path.exists(destination):
+        # a rotation part way through the hour, its writers numbered from 1 again
+        asset_name, data_type = match["asset_name"], match["data_type"]
+        seq_no = next_seq_no(output_directory, asset_name, data_type)
+        destination = os.path.join(
+            output_directory, f"{asset_name}-{data_type}-{seq_no}.parquet"
         )
+    # anything else (the symbol table, targets) is the process's latest, ids only
+    # ever grow
+    os.replace(os.path.join(staging_directory, file), destination)
 
 
 @logger.catch
-def main():
-    load_logging_config()
-
-    now = datetime.now()
+def finish_hour(staging_directory: str, output_directory: str):
+    # closed Arrow IPC files (ipc output) are compressed to Parquet before the move
+    arrow_files = [e for e in os.listdir(staging_directory) if e.endswith(".arrow")]
+    if arrow_files:
+        from writers.ipc_writer import convert_to_parquet
+
+        for arrow_file in arrow_files:
+            convert_to_parquet(os.path.join(staging_directory, arrow_file))
+
+    # move the hour's parquets and targets file to the plan's output directory
+    files = os.listdir(staging_directory)
+    if files:
+        # the process's symbol ids, an Enum over them reads every file with one set of
+        # codes
+        files.append(os.path.basename(SYMBOLS.write(staging_directory)))
+        os.makedirs(output_directory, exist_ok=True)
+
+        moved = 0
+        for file in files:
+            try:
+                _move(staging_directory, file, output_directory)
+                moved += 1
+            except OSError as e:
+                # left in staging, a failed move must not end the capture
+                logger.error("Could not move {} to {}: {}", file, output_directory, e)
+
+        logger.info("{} files moved to '{}'.", moved, output_directory)
+
+    if not os.listdir(staging_directory):
+        os.rmdir(staging_directory)
+
+
+def output_targets(staging_directory: str):
+    targets = {
+        f"{venue}_target": TARGET_PRICES[venue](symbol)
+        for venue, symbol in plan.targets.items()
+    }
+
+    with open(os.path.join(staging_directory, "targets.json"), "w") as f:
+        json.dump(targets, f, indent=4)
+
+
+def _next_rotation(now: datetime) -> datetime:
+    # a second early, so the next hour's connections are up when it starts
     next_hour = now.replace(minute=59, second=59, microsecond=0)
-    delay = (next_hour - now).total_seconds()  # calculate delay till next hour
-
-    if delay <= 1:
+    if (next_hour - now).total_seconds() <= 1:
         next_hour = (now + timedelta(hours=1)).replace(
             minute=59, second=59, microsecond=0
         )
-        delay = (next_hour - now).total_seconds()
+    return next_hour
+
+
+def _staging_directory(now: datetime) -> str:
+    return os.path.join(STAGING_DIRECTORY, now.strftime("%Y%m%dT%H%M%S"))
 
-    global target_thread
-    target_thread = threading.Timer(
-        60, output_targets
-    )  # 1 minute delay for initial candles
 
-    t1 = threading.Thread(target=run_binance_capture_thread)
-    t2 = threading.Thread(target=run_polymarket_capture_thread)
-    t3 = threading.Thread(target=run_hyperliquid_capture_thread)
+def _output_directory(now: datetime, slug: str | None) -> str:
+    hour = now.astimezone(timezone.utc).strftime("%Y-%m-%dT%H")
+    return plan.output_directory.format(slug=slug or hour, hour=hour)
 
-    global timing_thread
-    timing_thread = threading.Timer(delay, fire_interrupt)
+
+@logger.catch
+def main():
+    load_logging_config()
+
+    # the bus publisher, features stage, venue writers and unchanged connections
+    # live as long as the process, a rotation only swaps what the new hour needs
+    global bus_publisher
+    bus_publisher = UnixSocketPublisher(BUS_SOCKET_PATH)
+    bus_publisher.start()
+
+    global feature_stage
+    if FEATURES_ENABLED:
+        from features.microstructure import FeatureStage
+
+        feature_stage = FeatureStage()
+        feature_stage.start()
 
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGUSR1, signal_handler)
-
-    t1.start()
-    t2.start()
-    t3.start()
-    timing_thread.start()
-    target_thread.start()
-
-    t1.join()
-    t2.join()
-    t3.join()
-    timing_thread.join()
-    target_thread.join()
+    TRACER.install_signal_handler()
+    PROFILER.install_signal_handler()
+
+    global target_thread, prewarm_thread
+    staging_directory = _staging_directory(datetime.now())
+    start_hour(staging_directory)
+    while True:
+        next_rotation = _next_rotation(datetime.now())
+        target_thread = threading.Timer(
+            60, output_targets, args=(staging_directory,)
+        )  # 1 minute delay for initial candles
+        prewarm_thread = threading.Timer(
+            (next_rotation - datetime.now()).total_seconds() - PREWARM_SECONDS,
+            prewarm_markets,
+            args=(next_rotation,),
+        )
+        target_thread.start()
+        prewarm_thread.start()
+
+        # unlike Thread.join, Event.wait lets the signal handlers run while waiting
+        while True:
+            remaining = (next_rotation - datetime.now()).total_seconds()
+            if remaining <= 0 or rotation.wait(
+                min(remaining, CONNECTION_CHECK_SECONDS)
+            ):
+                break
+            _restart_dropped_connections()
+        rotation.clear()
+        target_thread.cancel()
+        prewarm_thread.cancel()
+
+        now = datetime.now()
+        slug = market_info.slug if market_info else None
+        if terminate:
+            break
+
+        logger.info("Rotating capture files")
+        finished_directory = staging_directory
+        staging_directory = _staging_directory(now)
+        retired = start_hour(staging_directory)
+
+        time.sleep(ROTATION_GRACE_SECONDS)
+        for pipeline in retired:
+            close_pipeline(pipeline)
+        finish_hour(finished_directory, _output_directory(now, slug))
+
+    if feature_stage is not None:
+        # emit the last partial interval while the writers are still subscribed
+        feature_stage.stop()
+
+    for t in starting:
+        t.join()
+    for venue in list(running):
+        _stop_venue(venue)
+
+    # only once every connection is down, so no shard writes to a closed writer
+    for venue, writer in venue_writers.items():
+        logger.debug("Closing {} writer.", venue)
+        writer.close()
+    venue_writers.clear()
+    finish_hour(staging_directory, _output_directory(now, slug))
+
+    bus_publisher.stop()
+    PROFILER.stop()  # dumps the profile if one is running
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+from dataclasses import dataclass, field
+
+import yaml
+
+from constants import (
+    BINANCE_WSS_URL,
+    CAPTURE_PLAN_FILE,
+    HYPERLIQUID_WSS_URL,
+    OUTPUT_FORMAT,
+    POLYMARKET_WSS_URL,
+)
+
+URLS = {
+    "binance": BINANCE_WSS_URL,
+    "hyperliquid": HYPERLIQUID_WSS_URL,
+    "polymarket": POLYMARKET_WSS_URL,
+}
+CHANNELS = {
+    "binance": ["bookTicker"],
+    "hyperliquid": ["l2Book", "trades", "bbo"],
+    "polymarket": ["market"],
+}
+N_SIG_FIGS = {2, 3, 4, 5, None}  # None is full precision
+# per connection limits are well under each venue's own (Binance allows 1024 streams)
+SUBSCRIPTIONS_PER_CONNECTION = {"binance": 200, "hyperliquid": 100, "polymarket": 500}
+# Hyperliquid allows 1000 subscriptions per IP, across all of its connections
+HYPERLIQUID_SUBSCRIPTION_LIMIT = 1000
+# venues whose opening price can go into targets.json, see capture.TARGET_PRICES
+TARGET_VENUES = {"binance", "hyperliquid"}
+# flush options each output format's writer takes
+FLUSH_OPTIONS = {
+    "parquet": {"buffer_size", "max_buffer_bytes", "row_group_size"},
+    "ipc": {"batch_size", "max_batch_seconds"},
+}
+
+
+@dataclass
+class VenuePlan:
+    venue: str
+    # Binance symbols, Hyperliquid coins ("*" for every listed perp) or Polymarket
+    # market prefixes
+    symbols: list[str]
+    url: str
+    channels: list[str]
+    depth: int | None = None
+    # Hyperliquid book aggregation levels, None is full precision
+    n_sig_figs: list[int | None] = field(default_factory=lambda: [5])
+    subscriptions_per_connection: int = 100
+    flush: dict = field(default_factory=dict)  # writer options, e.g. buffer_size
+
+    def subscriptions_per_symbol(self) -> int:
+        # a Hyperliquid l2Book subscription per aggregation level, the other channels
+        # once
+        books = self.channels.count("l2Book")
+        return books * len(self.n_sig_figs) + len(self.channels) - books
+
+    def shards(self, items: list, subscriptions_per_item=1) -> list[list]:
+        n = max(self.subscriptions_per_connection // subscriptions_per_item, 1)
+        return [items[i : i + n] for i in range(0, len(items), n)]
+
+
+@dataclass
+class CapturePlan:
+    venues: dict[str, VenuePlan]
+    output_format: str = OUTPUT_FORMAT
+    # where rotated files go, {slug} is the primary Polymarket market and {hour} the
+    # UTC hour
+    output_directory: str = "data/{slug}"
+    targets: dict[str, str] = field(default_factory=dict)  # venue -> symbol
+
+
+def flush_options(venue: str, flush: dict, output_format: str) -> dict:
+    """A venue's flush policy as options of the output format's writer."""
+    if output_format == "ipc" and "buffer_size" in flush:
+        # rows held before a write, an IPC stream writes them as one record batch
+        flush = {k: v for k, v in flush.items() if k != "buffer_size"} | {
+            "batch_size": flush["buffer_size"]
+        }
+    unsupported = set(flush) - FLUSH_OPTIONS[output_format]
+    if unsupported:
+        raise ValueError(
+            f"Unsupported {venue} flush options {sorted(unsupported)} for "
+            f"{output_format} output"
+        )
+    return flush
+
+
+def check_hyperliquid_subscriptions(venue_plan: VenuePlan, n_coins: int):
+    subscriptions = n_coins * venue_plan.subscriptions_per_symbol()
+    if subscriptions > HYPERLIQUID_SUBSCRIPTION_LIMIT:
+        raise ValueError(
+            f"{n_coins} Hyperliquid coins need {subscriptions} subscriptions "
+            f"({venue_plan.subscriptions_per_symbol()} each for channels "
+            f"{venue_plan.channels} and n_sig_figs {venue_plan.n_sig_figs}), over "
+            f"the limit of {HYPERLIQUID_SUBSCRIPTION_LIMIT} per IP"
+        )
+
+
+def parse_capture_plan(config: dict) -> CapturePlan:
+    output = config.get("output") or {}
+    output_format = output.get("format", OUTPUT_FORMAT)
+    if output_format not in FLUSH_OPTIONS:
+        raise ValueError(f"Unknown output format {output_format} in capture plan")
+
+    venues = {}
+    for venue, v in (config.get("venues") or {}).items():
+        if venue not in URLS:
+            raise ValueError(f"Unknown venue {venue} in capture plan")
+
+        channels = v.get("channels", CHANNELS[venue])
+        unsupported = set(channels) - set(CHANNELS[venue])
+        if unsupported:
+            raise ValueError(f"Unsupported {venue} channels {sorted(unsupported)}")
+
+        n_sig_figs = v.get("n_sig_figs", 5)
+        if not isinstance(n_sig_figs, list):
+            n_sig_figs = [n_sig_figs]
+        if set(n_sig_figs) - N_SIG_FIGS:
+            raise ValueError(f"Unsupported {venue} n_sig_figs {n_sig_figs}")
+
+        venues[venue] = VenuePlan(
+            venue=venue,
+            symbols=v["symbols"],
+            url=v.get("url") or URLS[venue],
+            channels=channels,
+            depth=v.get("depth"),
+            n_sig_figs=n_sig_figs,
+            subscriptions_per_connection=v.get(
+                "subscriptions_per_connection", SUBSCRIPTIONS_PER_CONNECTION[venue]
+            ),
+            flush=flush_options(venue, v.get("flush") or {}, output_format),
+        )
+        if venue == "hyperliquid" and v["symbols"] != ["*"]:
+            # "*" is only known once the perps are listed, capture checks it then
+            check_hyperliquid_subscriptions(venues[venue], len(v["symbols"]))
+
+    targets = config.get("targets") or {}
+    unsupported = set(targets) - TARGET_VENUES
+    if unsupported:
+        raise ValueError(
+            f"No target price for venues {sorted(unsupported)}, targets are only "
+            f"supported for {sorted(TARGET_VENUES)}"
+        )
+
+    return CapturePlan(
+        venues=venues,
+        output_format=output_format,
+        output_directory=output.get("directory", "data/{slug}"),
+        targets=targets,
+    )
+
+
+def load_capture_plan(path=CAPTURE_PLAN_FILE) -> CapturePlan:
+    with open(path, "r") as f:
+        return parse_capture_plan(yaml.safe_load(f))
@@ -5,13 +5,18 @@ import sys
 import yaml
 from loguru import logger
 
-from constants import LOG_CONFIG_FILE
+from constants import CONFLATION_CONFIG_FILE, LOG_CONFIG_FILE
+from profiling import PROFILER
+from tracing import TRACER
 
 
 def load_logging_config():
     with open(LOG_CONFIG_FILE, "r") as f:
         config = yaml.safe_load(f)
 
+    tracing_config = config.pop("tracing", {})
+    profiling_config = config.pop("profiling", {})
+
     for i, h in enumerate(config["handlers"]):
         if "sink" in h and "sys" in h["sink"]:
             match h["sink"]:
@@ -23,3 +28,13 @@ def load_logging_config():
                     pass
 
     logger.configure(**config)
+    TRACER.configure(**tracing_config)
+    PROFILER.configure(**profiling_config)
+
+
+def load_conflation_config() -> dict:
+    try:
+        with open(CONFLATION_CONFIG_FILE, "r") as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
@@ -1,14 +1,46 @@
 #!/usr/bin/env python3
 
-# urls
-POLYMARKET_GAMMA_URL = "https://gamma-api.polymarket.com"
-POLYMARKET_WSS_URL = "wss://ws-subscriptions-clob.polymarket.com"
-HYPERLIQUID_WSS_URL = "wss://api.hyperliquid.xyz/ws"
-HYPERLIQUID_API_URL = "https://api.hyperliquid.xyz/info"
+import os
 
-BINANCE_API_URL = "https://api.binance.com/api"
+# urls (overridable through the environment, e.g. to point at the stand-in server in simulator/)
+POLYMARKET_GAMMA_URL = os.getenv(
+    "POLYMARKET_GAMMA_URL", "https://gamma-api.polymarket.com"
+)
+POLYMARKET_WSS_URL = os.getenv(
+    "POLYMARKET_WSS_URL", "wss://ws-subscriptions-clob.polymarket.com"
+)
+POLYMARKET_CLOB_URL = os.getenv("POLYMARKET_CLOB_URL", "https://clob.polymarket.com")
+HYPERLIQUID_WSS_URL = os.getenv("HYPERLIQUID_WSS_URL", "wss://api.hyperliquid.xyz/ws")
+HYPERLIQUID_API_URL = os.getenv(
+    "HYPERLIQUID_API_URL", "https://api.hyperliquid.xyz/info"
+)
+
+BINANCE_API_URL = os.getenv("BINANCE_API_URL", "https://api.binance.com/api")
+BINANCE_WSS_URL = os.getenv("BINANCE_WSS_URL", "wss://stream.binance.com:9443")
 
 # configs
 LOG_CONFIG_FILE = "logging_config.yaml"
+CONFLATION_CONFIG_FILE = os.getenv("CONFLATION_CONFIG_FILE", "conflation.yaml")
+CAPTURE_PLAN_FILE = os.getenv("CAPTURE_PLAN_FILE", "capture_plan.yaml")
 
 TIMER_INTERVAL_SECONDS = 10
+
+# local consumers subscribe to captured events on this unix socket (see bus/client.py)
+BUS_SOCKET_PATH = os.getenv("BUS_SOCKET_PATH", "/tmp/el-capturo.sock")
+
+# optional features stage computing microstructure signals at capture time
+FEATURES_ENABLED = os.getenv("FEATURES_ENABLED", "0") == "1"
+FEATURE_INTERVAL_SECONDS = float(os.getenv("FEATURE_INTERVAL_SECONDS", 1))
+FEATURE_TOP_LEVELS = int(os.getenv("FEATURE_TOP_LEVELS", 5))
+
+# each hour's files are written under here, then moved to the plan's output directory
+STAGING_DIRECTORY = os.getenv("STAGING_DIRECTORY", ".capture")
+
+# "parquet", or "ipc" to append Arrow IPC batches readable while capturing (converted on rotation)
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "parquet")
+
+# process-wide writer memory budget
+MEMORY_BUDGET_BYTES = int(os.getenv("MEMORY_BUDGET_BYTES", 512 * 1024 * 1024))
+MEMORY_BUDGET_POLICY = os.getenv("MEMORY_BUDGET_POLICY", "largest")  # or "oldest"
+MAX_BUFFER_AGE_SECONDS = float(os.getenv("MAX_BUFFER_AGE_SECONDS", 15 * 60))
+SPILL_DIRECTORY = os.getenv("SPILL_DIRECTORY")  # spill instead of flushing early if set
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+import threading
+import time
+from datetime import datetime, timezone
+
+from bus.event_bus import EVENT_BUS, EventBus
+from constants import FEATURE_INTERVAL_SECONDS, FEATURE_TOP_LEVELS
+
+FEATURES = "features"
+# how often finished intervals are looked for, and how late events may still arrive
+EMIT_CHECK_SECONDS = 0.5
+
+
+def _level(row: dict, side: str, i: int) -> tuple[float | None, float | None]:
+    # wide books carry bid_{i}_price, Binance bookTicker only has bid_price
+    price = row.get(f"{side}_{i}_price")
+    if price is None and i == 1:
+        return row.get(f"{side}_price"), row.get(f"{side}_size")
+    return price, row.get(f"{side}_{i}_size")
+
+
+class AssetFeatures:
+    def __init__(self, venue: str, asset_name: str, top_levels: int):
+        self.venue = venue
+        self.asset_name = asset_name
+        self.top_levels = top_levels
+        self.interval = None
+
+        # state carried across intervals
+        self.mid = None
+        self.microprice = None
+        self.spread = None
+        self.imbalance_1 = None
+        self.imbalance_n = None
+        self._reset()
+
+    def _reset(self):
+        self.book_updates = 0
+        self.trades = 0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.open = None
+        self.high = None
+        self.low = None
+        self.close = None
+        self.mid_open = self.mid
+
+    def on_book(self, row: dict):
+        bid, bid_size = _level(row, "bid", 1)
+        ask, ask_size = _level(row, "ask", 1)
+        self.book_updates += 1
+        if bid is None or ask is None:
+            return
+
+        self.mid = (bid + ask) / 2
+        self.spread = ask - bid
+        if bid_size + ask_size > 0:
+            self.microprice = (bid * ask_size + ask * bid_size) / (bid_size + ask_size)
+            self.imbalance_1 = (bid_size - ask_size) / (bid_size + ask_size)
+
+        bid_depth = 0.0
+        ask_depth = 0.0
+        for i in range(1, self.top_levels + 1):
+            _, b = _level(row, "bid", i)
+            _, a = _level(row, "ask", i)
+            bid_depth += b or 0.0
+            ask_depth += a or 0.0
+        if bid_depth + ask_depth > 0:
+            self.imbalance_n = (bid_depth - ask_depth) / (bid_depth + ask_depth)
+
+        if self.mid_open is None:
+            self.mid_open = self.mid
+
+    def on_trade(self, row: dict):
+        price = row["price"]
+        size = row["size"]
+        self.trades += 1
+        if row.get("side") == "SELL":
+            self.sell_volume += size
+        else:
+            self.buy_volume += size
+
+        if self.open is None:
+            self.open = self.high = self.low = price
+        self.high = max(self.high, price)
+        self.low = min(self.low, price)
+        self.close = price
+
+    def emit(self, interval_seconds: float) -> dict:
+        volume = self.buy_volume + self.sell_volume
+        row = {
+            "timestamp": datetime.fromtimestamp(
+                (self.interval + 1) * interval_seconds, timezone.utc
+            ),
+            "asset_name": self.asset_name,
+            "venue": self.venue,
+            "mid": self.mid,
+            "mid_open": self.mid_open,
+            "microprice": self.microprice,
+            "spread": self.spread,
+            "imbalance_1": self.imbalance_1,
+            f"imbalance_{self.top_levels}": self.imbalance_n,
+            "trade_flow_imbalance": (
+                (self.buy_volume - self.sell_volume) / volume if volume else None
+            ),
+            "open": self.open,
+            "high": self.high,
+            "low": self.low,
+            "close": self.close,
+            "volume": volume,
+            "trades": self.trades,
+            "book_updates": self.book_updates,
+        }
+        self._reset()
+        return row
+
+
+class FeatureStage:
+    def __init__(
+        self,
+        interval_seconds=FEATURE_INTERVAL_SECONDS,
+        top_levels=FEATURE_TOP_LEVELS,
+        bus: EventBus = EVENT_BUS,
+    ):
+        self.interval_seconds = interval_seconds
+        self.top_levels = top_levels
+        self.bus = bus
+        self.assets = {}  # (venue, asset_name) -> AssetFeatures
+        # the venues' websocket threads and the emit thread share the assets
+        self.lock = threading.Lock()
+        self.subscription = None
+        self.emit_thread = None
+        self.stopped = threading.Event()
+
+    def on_event(self, venue: str, data_type: str, data: dict):
+        key = (venue, data["asset_name"])
+        interval = int(data["timestamp"].timestamp() // self.interval_seconds)
+        with self.lock:
+            features = self.assets.get(key)
+            if features is None:
+                features = self.assets[key] = AssetFeatures(
+                    venue, data["asset_name"], self.top_levels
+                )
+
+            finished = None
+            if features.interval is None:
+                features.interval = interval
+            elif interval > features.interval:
+                # the previous interval is complete once an event from a later one
+                # arrives, or once the emit thread sees it has ended
+                finished = features.emit(self.interval_seconds)
+                features.interval = interval
+
+            if data_type == "trade":
+                features.on_trade(data)
+            else:
+                features.on_book(data)
+
+        if finished is not None:
+            self.bus.publish(venue, FEATURES, finished)
+
+    def _emit_finished(self):
+        while not self.stopped.wait(EMIT_CHECK_SECONDS):
+            # intervals that ended at least EMIT_CHECK_SECONDS ago
+            current = int((time.time() - EMIT_CHECK_SECONDS) // self.interval_seconds)
+            finished = []
+            with self.lock:
+                for (venue, _), features in self.assets.items():
+                    if features.interval is not None and features.interval < current:
+                        finished.append((venue, features.emit(self.interval_seconds)))
+                        features.interval = None  # until its next event
+
+            for venue, row in finished:
+                self.bus.publish(venue, FEATURES, row)
+
+    def start(self):
+        self.subscription = self.bus.subscribe(
+            self.on_event, data_types=["orderbook", "trade"]
+        )
+        # so a quiet asset's last interval is written on time, not on its next event
+        self.emit_thread = threading.Thread(
+            target=self._emit_finished, name="feature-intervals", daemon=True
+        )
+        self.emit_thread.start()
+
+    def stop(self):
+        self.bus.unsubscribe(self.subscription)
+        self.stopped.set()
+        if self.emit_thread is not None:
+            self.emit_thread.join()
+
+        with self.lock:
+            finished = [
+                (venue, features.emit(self.interval_seconds))
+                for (venue, _), features in self.assets.items()
+                if features.interval is not None
+            ]
+            self.assets.clear()
+        for venue, row in finished:
+            self.bus.publish(venue, FEATURES, row)
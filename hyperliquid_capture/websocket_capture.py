@@ -3,27 +3,70 @@
 import json
 import os
 import threading
-from collections import defaultdict
+import time
+from collections import Counter, defaultdict
 from datetime import datetime, timezone
 from enum import Enum
 from functools import reduce
 
+from bus.event_bus import EVENT_BUS
 from config_manager import load_logging_config
 from constants import HYPERLIQUID_WSS_URL, TIMER_INTERVAL_SECONDS
 from loguru import logger
+from profiling import PROFILER
+from symbols import SYMBOLS
+from tracing import TRACER
 from utils import convert_timestamp
 from websocket import WebSocketApp, WebSocketConnectionClosedException
-from writers.parquet_writer import ParquetWriter
+from writers.venue_writer import VenueWriter
 
 
 class Channel(Enum):
     MARKET_CHANNEL = "l2Book"
+    TRADES_CHANNEL = "trades"
+    BBO_CHANNEL = "bbo"
+
+
+VENUE = "hyperliquid"
+READ_TIMEOUT_SECONDS = 1
+RATE_LOG_SECONDS = 60
+RATE_LOG_TOP = 5  # busiest subscriptions logged at info, all of them at debug
+
+
+def aggregation_name(n_sig_figs: int | None) -> str:
+    return "full" if n_sig_figs is None else f"sf{n_sig_figs}"
 
 
 class WebsocketOrderBookCapture:
-    def __init__(self, channel_type, url):
-        self.channel_type = channel_type
+    def __init__(
+        self,
+        channels,
+        url,
+        coins=("BTC",),
+        n_sig_figs=5,
+        levels=10,
+        writer: VenueWriter | None = None,
+        tag_aggregation=False,
+    ):
+        # l2Book updates do not say which nSigFigs they are for, so a connection
+        # carries a single aggregation level for all of its coins
+        self.channels = channels
         self.url = url
+        self.coins = coins
+        self.n_sig_figs = n_sig_figs
+        self.levels = levels
+        # with several aggregation levels captured, books are written per level as
+        # e.g. BTC-sf3, trades and bbo stay under the coin name
+        self.book_names = {
+            c: f"{c}-{aggregation_name(n_sig_figs)}" if tag_aggregation else c
+            for c in coins
+        }
+        # and tagged rows carry the coin and level in columns of their own
+        self.book_columns = (
+            {"aggregation": SYMBOLS.intern(aggregation_name(n_sig_figs))}
+            if tag_aggregation
+            else None
+        )
         self.markets = None
         self.wsapp = WebSocketApp(
             self.url,
@@ -33,80 +76,167 @@ class WebsocketOrderBookCapture:
             on_open=self.on_open,
         )
         self.orderbooks = defaultdict(dict)  # orderbooks per coin
+        self.message_counts = Counter()  # (channel, coin) -> messages
+        self.rates_logged = (time.monotonic(), Counter())
         self.exit_code = 0
-        self.writer = ParquetWriter(buffer_size=1e3)
+        # a writer passed in is shared with other connections and closed by its owner
+        self.owns_writer = writer is None
+        self.writer = writer or VenueWriter(VENUE, buffer_size=1e3)
 
     def on_message(self, ws: WebSocketApp, message: str):
         if message == "PONG":
             logger.debug("Got PONG")
             return
 
-        data = json.loads(message)
-        logger.debug("Received data: {}", data)
+        TRACER.record(VENUE, message)
+        with PROFILER.stage(VENUE, "decode"):
+            data = json.loads(message)
 
-        if data["channel"] == "subscriptionResponse":
-            logger.debug("Sucessfully subscribed to hyperliquid feed")
-            return
+        match data["channel"]:
+            case "subscriptionResponse":
+                logger.debug("Sucessfully subscribed to hyperliquid feed")
+            case Channel.MARKET_CHANNEL.value:
+                self.on_book(data["data"])
+            case Channel.TRADES_CHANNEL.value:
+                self.on_trades(data["data"])
+            case Channel.BBO_CHANNEL.value:
+                self.on_bbo(data["data"])
+            case _:
+                logger.warning("Unknown channel: {}", data["channel"])
+                return
 
-        if data["channel"] != self.channel_type.value:
-            logger.warning("Unknown channel: {}", data["channel"])
-            return
+        if time.monotonic() - self.rates_logged[0] >= RATE_LOG_SECONDS:
+            self.log_rates()
 
-        coin = data["data"]["coin"]
-        levels = data["data"]["levels"]
+    def on_book(self, data: dict):
+        coin = data["coin"]
+        levels = data["levels"]
+        self.message_counts[(Channel.MARKET_CHANNEL.value, coin)] += 1
 
-        if coin not in self.orderbooks:
-            self.orderbooks[coin] = {"bids": [], "asks": []}
+        if TRACER.enabled and TRACER.sample(VENUE, coin):
+            TRACER.trace("Received data: {}", data)
 
-        self.orderbooks[coin]["bids"] = [
-            {"price": float(b["px"]), "size": float(b["sz"])}
-            for i, b in enumerate(levels[0], start=1)
-        ]
-        self.orderbooks[coin]["asks"] = [
-            {"price": float(a["px"]), "size": float(a["sz"])}
-            for i, a in enumerate(levels[1], start=1)
-        ]
+        with PROFILER.stage(VENUE, "book"):
+            if coin not in self.orderbooks:
+                self.orderbooks[coin] = {"bids": [], "asks": []}
+
+            self.orderbooks[coin]["bids"] = [
+                {"price": float(b["px"]), "size": float(b["sz"])}
+                for i, b in enumerate(levels[0], start=1)
+            ]
+            self.orderbooks[coin]["asks"] = [
+                {"price": float(a["px"]), "size": float(a["sz"])}
+                for i, a in enumerate(levels[1], start=1)
+            ]
 
-        serialized_book = self.serialize(coin)
-        self.writer.write(
-            data_type="orderbook",
-            data={
+            serialized_book = self.serialize(coin, self.levels)
+
+        with PROFILER.stage(VENUE, "row"):
+            row = {
                 "timestamp": datetime.now(timezone.utc),
-                "exchange_timestamp": convert_timestamp(data["data"]["time"]),
-                "asset_name": coin,
+                "exchange_timestamp": convert_timestamp(data["time"]),
+                "asset_name": SYMBOLS.intern(self.book_names.get(coin, coin)),
             }
-            | reduce(lambda x, y: x | y, serialized_book, {}),
+            if self.book_columns:
+                row["coin"] = SYMBOLS.intern(coin)
+                row |= self.book_columns
+            row |= reduce(lambda x, y: x | y, serialized_book, {})
+
+        with PROFILER.stage(VENUE, "publish"):
+            EVENT_BUS.publish(VENUE, "orderbook", row)
+
+    def on_trades(self, trades: list[dict]):
+        if trades:  # a message carries the trades of one coin
+            self.message_counts[(Channel.TRADES_CHANNEL.value, trades[0]["coin"])] += 1
+
+        now = datetime.now(timezone.utc)
+        for t in trades:
+            with PROFILER.stage(VENUE, "publish"):
+                EVENT_BUS.publish(
+                    VENUE,
+                    "trade",
+                    {
+                        "timestamp": now,
+                        "exchange_timestamp": convert_timestamp(t["time"]),
+                        "asset_name": SYMBOLS.intern(t["coin"]),
+                        "trade_id": t["tid"],
+                        "side": "BUY" if t["side"] == "B" else "SELL",  # aggressor
+                        "price": float(t["px"]),
+                        "size": float(t["sz"]),
+                    },
+                )
+
+    def on_bbo(self, data: dict):
+        coin = data["coin"]
+        bid, ask = data["bbo"]  # either side is null on an empty book
+        self.message_counts[(Channel.BBO_CHANNEL.value, coin)] += 1
+
+        row = {
+            "timestamp": datetime.now(timezone.utc),
+            "exchange_timestamp": convert_timestamp(data["time"]),
+            "asset_name": SYMBOLS.intern(coin),
+            "bid_1_price": float(bid["px"]) if bid else None,
+            "bid_1_size": float(bid["sz"]) if bid else None,
+            "ask_1_price": float(ask["px"]) if ask else None,
+            "ask_1_size": float(ask["sz"]) if ask else None,
+        }
+
+        with PROFILER.stage(VENUE, "publish"):
+            EVENT_BUS.publish(VENUE, "bbo", row)
+
+    def rates(self) -> dict[str, float]:
+        """Messages per second of each subscription since the rates were last logged."""
+        since, counted = self.rates_logged
+        elapsed = max(time.monotonic() - since, 1e-9)
+        return {
+            f"{channel}:{coin}": (n - counted[(channel, coin)]) / elapsed
+            for (channel, coin), n in self.message_counts.items()
+        }
+
+    def log_rates(self):
+        rates = self.rates()
+        self.rates_logged = (time.monotonic(), self.message_counts.copy())
+        if not rates:
+            return
+
+        busiest = sorted(rates.items(), key=lambda r: -r[1])
+        logger.info(
+            "{} ({}) {:.1f} msg/s over {} subscriptions, busiest: {}",
+            VENUE,
+            aggregation_name(self.n_sig_figs),
+            sum(rates.values()),
+            len(rates),
+            ", ".join(f"{k} {r:.1f}/s" for k, r in busiest[:RATE_LOG_TOP]),
         )
+        logger.debug("{} rates: {}", VENUE, {k: round(r, 2) for k, r in busiest})
 
     def on_error(self, ws: WebSocketApp, error: str):
         if error:
             logger.error("Error: {}", error)
             self.exit_code = 1
+            TRACER.dump(f"{VENUE} error: {error}")
 
     def on_close(self, ws, close_status_code, close_msg):
         logger.debug("Closing connection.")
+        self.log_rates()
 
-        del self.writer
+        if self.owns_writer:
+            self.writer.close()
 
     def on_open(self, ws):
         logger.debug("Connected to websocket server.")
 
-        if self.channel_type == Channel.MARKET_CHANNEL:
-            req = json.dumps(
-                {
-                    "method": "subscribe",
-                    "subscription": {
-                        "type": self.channel_type.value,
-                        "coin": "BTC",
-                        "nSigFigs": 5,
-                    },
-                }
-            )
-        else:
-            exit(1)
+        # one subscription per coin and channel, all on this connection
+        for channel in self.channels:
+            for coin in self.coins:
+                subscription = {"type": channel.value, "coin": coin}
+                if channel == Channel.MARKET_CHANNEL:
+                    subscription["nSigFigs"] = self.n_sig_figs  # null is full precision
 
-        logger.debug("Sending websocket request: {}", req, serialize=True)
-        ws.send(req)
+                req = json.dumps({"method": "subscribe", "subscription": subscription})
+
+                logger.debug("Sending websocket request: {}", req, serialize=True)
+                ws.send(req)
 
     def serialize(self, coin, levels=10):
         return [
@@ -121,20 +251,36 @@ class WebsocketOrderBookCapture:
         ]
 
     def run(self):
-        self.wsapp_thread = threading.Thread(target=self.wsapp.run_forever)
+        # without a ping_interval no pings are sent, the timeout only bounds how long
+        # the read loop takes to notice stop() (10 seconds by default)
+        self.wsapp_thread = threading.Thread(
+            target=self.wsapp.run_forever, kwargs={"ping_timeout": READ_TIMEOUT_SECONDS}
+        )
         self.wsapp_thread.start()
 
+    def is_alive(self) -> bool:
+        # run_forever returns once the connection drops, it does not reconnect
+        return self.wsapp_thread.is_alive()
+
     def stop(self):
         self.wsapp.close()
         self.wsapp_thread.join()
 
 
 @logger.catch
-def run_capture() -> WebsocketOrderBookCapture:
+def run_capture(
+    url=HYPERLIQUID_WSS_URL,
+    coins=("BTC",),
+    n_sig_figs=5,
+    levels=10,
+    writer: VenueWriter | None = None,
+    channels=(Channel.MARKET_CHANNEL,),
+    tag_aggregation=False,
+) -> WebsocketOrderBookCapture:
     # TODO: get candle
 
     market_connection = WebsocketOrderBookCapture(
-        Channel.MARKET_CHANNEL, HYPERLIQUID_WSS_URL
+        channels, url, coins, n_sig_figs, levels, writer, tag_aggregation
     )
 
     market_connection.run()
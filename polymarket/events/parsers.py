@@ -16,10 +16,16 @@ def parse_order(order: dict) -> Order:
     return Order(price=float(order["price"]), size=float(order["size"]))
 
 
+def _optional_float(value) -> float | None:
+    return float(value) if value is not None else None
+
+
 def parse_change(change: dict) -> Change:
     return Change(
         order=Order(price=float(change["price"]), size=float(change["size"])),
         side=Side(change["side"]),
+        best_bid=_optional_float(change.get("best_bid")),
+        best_ask=_optional_float(change.get("best_ask")),
     )
 
 
@@ -29,6 +35,7 @@ def parse_book_event(event: dict) -> BookEvent:
         bids=[parse_order(b) for b in event["bids"]],
         asks=[parse_order(a) for a in event["asks"]],
         timestamp=convert_timestamp(event["timestamp"]),
+        hash=event.get("hash"),
     )
 
 
@@ -37,6 +44,7 @@ def parse_price_change_event(event: dict) -> PriceChangeEvent:
         asset=event["asset_id"],
         changes=[parse_change(c) for c in event["changes"]],
         timestamp=convert_timestamp(event["timestamp"]),
+        hash=event.get("hash"),
     )
 
 
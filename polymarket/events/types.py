@@ -38,6 +38,9 @@ class Order(BaseModel):
 class Change:
     order: Order
     side: Side
+    # the venue's top of book after the change, when it sends it
+    best_bid: float | None = None
+    best_ask: float | None = None
 
 
 @dataclass
@@ -46,6 +49,7 @@ class BookEvent:
     bids: List[Order]
     asks: List[Order]
     timestamp: datetime
+    hash: str | None = None
 
 
 @dataclass
@@ -53,6 +57,7 @@ class PriceChangeEvent:
     asset: Token
     changes: List[Change]
     timestamp: datetime
+    hash: str | None = None
 
 
 @dataclass
@@ -24,9 +24,11 @@ class MarketInfo:
     tokens: List[Token]
 
 
-def get_hourly_market_info_for(market="bitcoin-up-or-down") -> List[MarketInfo]:
+def get_hourly_market_info_for(
+    market="bitcoin-up-or-down", at: datetime | None = None
+) -> List[MarketInfo]:
     # make slug in the form "market-{month_str}-{day}-{hour}-et"
-    now = datetime.now(pytz.timezone("US/Eastern"))
+    now = (at or datetime.now()).astimezone(pytz.timezone("US/Eastern"))
 
     # offset by 5 seconds for the on the hour restart edge case
     now = (now + timedelta(seconds=5)).replace(minute=0, second=0, microsecond=0)
@@ -58,3 +60,26 @@ def get_hourly_market_info_for(market="bitcoin-up-or-down") -> List[MarketInfo]:
         )
         for market in markets
     ]
+
+
+def get_hourly_market_infos(
+    markets=("bitcoin-up-or-down",), at: datetime | None = None
+) -> List[MarketInfo]:
+    """Each prefix's hourly market at a time (default now), the first is the primary."""
+    market_info = []
+    for market in markets:
+        found = get_hourly_market_info_for(market=market, at=at)
+
+        assert len(found) >= 1, f"No market info retrieved for {market}!"
+
+        if len(found) > 1:
+            logger.warning("More than 1 market read, got {}", len(found))
+
+        if len(markets) > 1:
+            # outcome names repeat across markets (Up/Down), keep asset names distinct
+            for token in found[0].tokens:
+                token.token_name = f"{market}-{token.token_name}"
+
+        market_info.append(found[0])
+
+    return market_info
@@ -19,8 +19,14 @@ class Orderbook:
     def __init__(self):
         self.bids = OrderedDict()
         self.asks = OrderedDict()
+        self.timestamp = None  # of the last applied event
+        self.hash = None  # the venue's hash of the book after the last event
+        # why the last event left the book out of line with the venue, None if it did
+        # not
+        self.divergence = None
 
     def apply_event(self, event: Event):
+        self.divergence = None
         match event:
             case BookEvent(asset=_, bids=bids, asks=asks, timestamp=_):
                 self.bids.clear()
@@ -31,19 +37,25 @@ class Orderbook:
                 self.asks = OrderedDict(sorted(self.asks.items()))
             case PriceChangeEvent(asset=_, changes=changes, timestamp=_):
                 for c in changes:
-                    if c.side == Side.BUY and c.order.price in self.bids:
-                        if c.order.size == 0:
-                            self.bids.pop(c.order.price)
-                        else:
-                            self.bids[c.order.price] = c.order
-                    elif c.side == Side.SELL and c.order.price in self.asks:
-                        if c.order.size == 0:
-                            self.asks.pop(c.order.price)
-                        else:
-                            self.asks[c.order.price] = c.order
+                    levels = self.bids if c.side == Side.BUY else self.asks
+                    if c.order.size != 0:
+                        levels[c.order.price] = c.order
+                    elif levels.pop(c.order.price, None) is None:
+                        self.divergence = "unknown_level"
                 self.bids = OrderedDict(sorted(self.bids.items(), reverse=True))
                 self.asks = OrderedDict(sorted(self.asks.items()))
 
+                # the venue's own top of book after the last change, when sent
+                top = changes[-1] if changes else None
+                if top is not None and (
+                    (top.best_bid and top.best_bid != self.best_bid())
+                    or (top.best_ask and top.best_ask != self.best_ask())
+                ):
+                    self.divergence = "top_of_book"
+
+        self.timestamp = event.timestamp
+        self.hash = event.hash
+
         if (
             len(list(self.bids.values()))
             and len(list(self.asks.values()))
@@ -54,6 +66,13 @@ class Orderbook:
                 list(self.bids.values())[:3],
                 list(self.asks.values())[:3],
             )
+            self.divergence = "crossed"
+
+    def best_bid(self) -> float | None:
+        return next(iter(self.bids), None)
+
+    def best_ask(self) -> float | None:
+        return next(iter(self.asks), None)
 
     def serialize(self, levels=5):
         return [
@@ -3,16 +3,23 @@
 import json
 import os
 import threading
-from collections import defaultdict
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from enum import Enum
 from functools import reduce
 
+from bus.event_bus import EVENT_BUS
 from config_manager import load_logging_config
-from constants import POLYMARKET_WSS_URL, TIMER_INTERVAL_SECONDS
+from constants import POLYMARKET_CLOB_URL, POLYMARKET_WSS_URL, TIMER_INTERVAL_SECONDS
 from loguru import logger
+from profiling import PROFILER
+from symbols import SYMBOLS
+from tracing import TRACER
+from utils import make_session
 from websocket import WebSocketApp, WebSocketConnectionClosedException
-from writers.parquet_writer import ParquetWriter
+from writers.venue_writer import VenueWriter
 
 from polymarket.events.parsers import (
     parse_book_event,
@@ -20,7 +27,7 @@ from polymarket.events.parsers import (
     parse_price_change_event,
 )
 from polymarket.events.types import BookEvent, LastTradePrice, PriceChangeEvent
-from polymarket.market_info import get_hourly_market_info_for, MarketInfo
+from polymarket.market_info import get_hourly_market_infos, MarketInfo
 from polymarket.orderbook.orderbook import Orderbook
 
 
@@ -29,12 +36,30 @@ class Channel(Enum):
     USER_CHANNEL = "user"
 
 
+VENUE = "polymarket"
+READ_TIMEOUT_SECONDS = 1
+# books out of line with the venue are fetched again over REST on this many threads
+RESYNC_WORKERS = 4
+RESYNC_TIMEOUT_SECONDS = 5
+RESYNC_LOG_SECONDS = 60
+
+
 class WebsocketOrderBookCapture:
-    def __init__(self, channel_type, url, tokens, auth):
+    def __init__(
+        self,
+        channel_type,
+        url,
+        tokens,
+        auth,
+        levels=5,
+        writer: VenueWriter | None = None,
+        clob_url=POLYMARKET_CLOB_URL,
+    ):
         self.channel_type = channel_type
         self.url = url
         self.tokens = {t.token_id: t for t in tokens}
         self.auth = auth
+        self.levels = levels
         self.markets = None
         furl = url + "/ws/" + channel_type.value
         self.wsapp = WebSocketApp(
@@ -45,8 +70,21 @@ class WebsocketOrderBookCapture:
             on_open=self.on_open,
         )
         self.orderbooks = defaultdict(Orderbook)  # orderbooks per asset_id
+        # the websocket thread and resyncs both update the books
+        self.orderbooks_lock = threading.Lock()
+        self.clob_url = clob_url
+        self.session = make_session(pool_size=RESYNC_WORKERS)
+        self.resync_executor = ThreadPoolExecutor(
+            RESYNC_WORKERS, thread_name_prefix="polymarket-resync"
+        )
+        # asset_id -> price changes received while its snapshot is being fetched
+        self.resyncing = {}
+        self.resync_counts = Counter()  # divergence reasons and resync outcomes
+        self.resyncs_logged = time.monotonic()
         self.exit_code = 0
-        self.writer = ParquetWriter(buffer_size=1e3)
+        # a writer passed in is shared with other connections and closed by its owner
+        self.owns_writer = writer is None
+        self.writer = writer or VenueWriter(VENUE, buffer_size=1e3)
         self.ping_thread = None
 
     def on_message(self, ws: WebSocketApp, message: str):
@@ -54,66 +92,171 @@ class WebsocketOrderBookCapture:
             logger.debug("Got PONG")
             return
 
-        messages = json.loads(message)
-        logger.debug("received message {}", messages)
+        if time.monotonic() - self.resyncs_logged >= RESYNC_LOG_SECONDS:
+            self.log_resyncs()
+
+        TRACER.record(VENUE, message)
+        with PROFILER.stage(VENUE, "decode"):
+            messages = json.loads(message)
 
         for message in messages:
-            match message["event_type"]:
-                case "book":
-                    event = parse_book_event(message)
-                case "price_change":
-                    event = parse_price_change_event(message)
-                case "tick_size_change":
-                    event = None
-                    pass
-                case "last_trade_price":
-                    event = parse_last_trade_price(message)
-                    pass
-                case _:
-                    logger.warning("Unknown message type: {}", message["event_type"])
-                    return
-
-            logger.debug("Parsed event {}", event, serialize=True)
+            with PROFILER.stage(VENUE, "parse"):
+                match message["event_type"]:
+                    case "book":
+                        event = parse_book_event(message)
+                    case "price_change":
+                        event = parse_price_change_event(message)
+                    case "tick_size_change":
+                        event = None
+                        pass
+                    case "last_trade_price":
+                        event = parse_last_trade_price(message)
+                        pass
+                    case _:
+                        logger.warning(
+                            "Unknown message type: {}", message["event_type"]
+                        )
+                        return
+
+            traced = TRACER.enabled and TRACER.sample(VENUE, message["asset_id"])
+            if traced:
+                TRACER.trace("Parsed event {}", event)
+
             match event:
                 case BookEvent() | PriceChangeEvent():
-                    self.orderbooks[message["asset_id"]].apply_event(event)
-                    serialized_book = self.orderbooks[message["asset_id"]].serialize()
-                    logger.debug(
-                        "Orderbook for {} is {}",
+                    with PROFILER.stage(VENUE, "book"), self.orderbooks_lock:
+                        self.apply_event(message["asset_id"], event)
+                        serialized_book = self.orderbooks[
+                            message["asset_id"]
+                        ].serialize(self.levels)
+                    if traced:
+                        TRACER.trace(
+                            "Orderbook for {} is {}", message["asset_id"], serialized_book
+                        )
+
+                    self.publish_book(
                         message["asset_id"],
+                        message["event_type"],
+                        event.timestamp,
                         serialized_book,
-                        serialize=True,
-                    )
-
-                    self.writer.write(
-                        data_type="orderbook",
-                        data={
-                            "timestamp": datetime.now(timezone.utc),
-                            "exchange_timestamp": event.timestamp,
-                            "asset_id": message["asset_id"],
-                            "asset_name": self.tokens[message["asset_id"]].token_name,
-                            "event_type": message["event_type"],
-                        }
-                        | reduce(lambda x, y: x | y, serialized_book, {}),
                     )
                 case LastTradePrice():
-                    self.writer.write(
-                        data_type="trade",
-                        data={
-                            "timestamp": datetime.now(timezone.utc),
-                            "exchange_timestamp": event.timestamp,
-                            "asset_id": message["asset_id"],
-                            "asset_name": self.tokens[message["asset_id"]].token_name,
-                            "side": event.side.value,
-                            "price": event.price,
-                            "size": event.size,
-                        },
-                    )
+                    with PROFILER.stage(VENUE, "publish"):
+                        EVENT_BUS.publish(
+                            VENUE,
+                            "trade",
+                            {
+                                "timestamp": datetime.now(timezone.utc),
+                                "exchange_timestamp": event.timestamp,
+                                "asset_id": SYMBOLS.id_of(message["asset_id"]),
+                                "asset_name": self.tokens[
+                                    message["asset_id"]
+                                ].token_name,
+                                "side": event.side.value,
+                                "price": event.price,
+                                "size": event.size,
+                            },
+                        )
+
+    def apply_event(self, asset_id: str, event: BookEvent | PriceChangeEvent):
+        # called with orderbooks_lock held
+        orderbook = self.orderbooks[asset_id]
+        if asset_id in self.resyncing:
+            if isinstance(event, BookEvent):
+                # the venue's own snapshot, the fetched one is no longer needed
+                self.resyncing.pop(asset_id)
+                self.resync_counts["superseded"] += 1
+            else:
+                self.resyncing[asset_id].append(event)
+
+        orderbook.apply_event(event)
+        if orderbook.divergence is None:
+            return
+
+        # deltas applied while a resync is in flight diverge again, count them once
+        if asset_id not in self.resyncing:
+            self.resync_counts[orderbook.divergence] += 1
+            logger.warning(
+                "{} book diverged ({}), resyncing",
+                self.tokens[asset_id].token_name,
+                orderbook.divergence,
+            )
+            self.resyncing[asset_id] = []
+            self.resync_executor.submit(self.resync, asset_id)
+
+    def resync(self, asset_id: str):
+        """Replaces a book with a REST snapshot while the websocket keeps streaming.
+
+        Price changes received while the snapshot was in flight and newer than it are
+        applied on top.
+        """
+        try:
+            response = self.session.get(
+                f"{self.clob_url}/book",
+                params={"token_id": asset_id},
+                timeout=RESYNC_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+            snapshot = parse_book_event(response.json())
+        except Exception as e:
+            logger.error(
+                "Resync of {} failed: {}", self.tokens[asset_id].token_name, e
+            )
+            with self.orderbooks_lock:
+                self.resyncing.pop(asset_id, None)
+                self.resync_counts["failed"] += 1
+            return
+
+        with self.orderbooks_lock:
+            if asset_id not in self.resyncing:  # superseded or stopped
+                return
+
+            orderbook = self.orderbooks[asset_id]
+            orderbook.apply_event(snapshot)
+            for event in self.resyncing.pop(asset_id):
+                if event.timestamp > snapshot.timestamp:
+                    orderbook.apply_event(event)
+
+            self.resync_counts["resynced"] += 1
+            if orderbook.divergence is not None:
+                self.resync_counts["resynced_diverged"] += 1
+            timestamp = orderbook.timestamp
+            serialized_book = orderbook.serialize(self.levels)
+
+        self.publish_book(asset_id, "resync", timestamp, serialized_book)
+
+    def publish_book(
+        self,
+        asset_id: str,
+        event_type: str,
+        exchange_timestamp: datetime,
+        serialized_book: list[dict],
+    ):
+        with PROFILER.stage(VENUE, "row"):
+            row = {
+                "timestamp": datetime.now(timezone.utc),
+                "exchange_timestamp": exchange_timestamp,
+                # ids instead of a fresh copy of both strings per row
+                "asset_id": SYMBOLS.id_of(asset_id),
+                "asset_name": self.tokens[asset_id].token_name,
+                "event_type": SYMBOLS.id_of(event_type),
+            } | reduce(lambda x, y: x | y, serialized_book, {})
+
+        with PROFILER.stage(VENUE, "publish"):
+            EVENT_BUS.publish(VENUE, "orderbook", row)
+
+    def log_resyncs(self):
+        self.resyncs_logged = time.monotonic()
+        with self.orderbooks_lock:
+            counts = dict(self.resync_counts)
+        if counts:
+            logger.info("{} book resyncs since start: {}", VENUE, counts)
 
     def on_error(self, ws: WebSocketApp, error: str):
         if error:
             logger.error("Error: {}", error)
             self.exit_code = 1
+            TRACER.dump(f"{VENUE} error: {error}")
 
     def on_close(self, ws: WebSocketApp, close_status_code: int, close_msg: str):
         logger.debug("Closing connection.")
@@ -121,7 +264,9 @@ class WebsocketOrderBookCapture:
         if self.ping_thread:
             self.ping_thread.cancel()
 
-        del self.writer
+        self.log_resyncs()
+        if self.owns_writer:
+            self.writer.close()
 
     def on_open(self, ws: WebSocketApp):
         match self.channel_type:
@@ -165,33 +310,51 @@ class WebsocketOrderBookCapture:
                 logger.warning("Caught exception {}", e)
 
     def run(self):
-        self.wsapp_thread = threading.Thread(target=self.wsapp.run_forever)
+        # without a ping_interval no pings are sent, the timeout only bounds how long
+        # the read loop takes to notice stop() (10 seconds by default)
+        self.wsapp_thread = threading.Thread(
+            target=self.wsapp.run_forever, kwargs={"ping_timeout": READ_TIMEOUT_SECONDS}
+        )
         self.wsapp_thread.start()
 
+    def is_alive(self) -> bool:
+        # run_forever returns once the connection drops, it does not reconnect
+        return self.wsapp_thread.is_alive()
+
     def stop(self):
         self.wsapp.close()
-        self.ping_thread.cancel()
+        if self.ping_thread:  # never set when the connection did not open
+            self.ping_thread.cancel()
         self.wsapp_thread.join()
+        with self.orderbooks_lock:
+            self.resyncing.clear()  # snapshots still in flight are dropped
+        # not waiting, a fetch can take RESYNC_TIMEOUT_SECONDS per retry
+        self.resync_executor.shutdown(wait=False, cancel_futures=True)
+        # a fetch still running fails and is counted as such
+        self.session.close()
 
 
-@logger.catch
-def run_capture() -> (WebsocketOrderBookCapture, MarketInfo):
-    api_key = os.getenv("API_KEY")
-    api_secret = os.getenv("API_SECRET")
-    api_passphrase = os.getenv("PASSPHRASE")
-
-    market_info = get_hourly_market_info_for(market="bitcoin-up-or-down")
+def get_auth() -> dict:
+    return {
+        "apiKey": os.getenv("API_KEY"),
+        "secret": os.getenv("API_SECRET"),
+        "passphrase": os.getenv("PASSPHRASE"),
+    }
 
-    assert len(market_info) >= 1, "No market info retrieved!"
 
-    if len(market_info) > 1:
-        logger.warning("More than 1 market read, got {}", len(market_info))
+@logger.catch
+def run_capture(
+    url=POLYMARKET_WSS_URL,
+    markets=("bitcoin-up-or-down",),
+    levels=5,
+    writer: VenueWriter | None = None,
+) -> (WebsocketOrderBookCapture, MarketInfo):
+    market_info = get_hourly_market_infos(markets)
 
-    tokens = market_info[0].tokens
-    auth = {"apiKey": api_key, "secret": api_secret, "passphrase": api_passphrase}
+    tokens = [t for m in market_info for t in m.tokens]
 
     market_connection = WebsocketOrderBookCapture(
-        Channel.MARKET_CHANNEL, POLYMARKET_WSS_URL, tokens, auth
+        Channel.MARKET_CHANNEL, url, tokens, get_auth(), levels, writer
     )
 
     market_connection.run()
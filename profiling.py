@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from loguru import logger
+
+# SIGUSR1 is taken by the hourly rotation in capture.py
+TOGGLE_SIGNAL = signal.SIGUSR2
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("totals", "key", "wall", "cpu")
+
+    def __init__(self, totals, key):
+        self.totals = totals
+        self.key = key
+
+    def __enter__(self):
+        self.wall = time.perf_counter_ns()
+        self.cpu = time.thread_time_ns()
+        return self
+
+    def __exit__(self, *_):
+        wall = time.perf_counter_ns() - self.wall
+        cpu = time.thread_time_ns() - self.cpu
+        totals = self.totals[self.key]
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += cpu
+        totals[3] = max(totals[3], wall)
+        return False
+
+
+class Profiler:
+    def __init__(self, interval_ms=5):
+        self.interval_ms = interval_ms
+        self.enabled = False
+        self.started = None
+        # (venue, stage) -> [count, wall, cpu, max wall] in ns
+        self.stages = defaultdict(lambda: [0, 0, 0, 0])
+        self.stacks = Counter()
+        self.sampler = None
+        self.lock = threading.Lock()
+
+    def configure(self, enabled=False, interval_ms=5):
+        # a config reload never stops a profile started by signal
+        self.interval_ms = interval_ms
+        if enabled and not self.enabled:
+            self.start()
+
+    def stage(self, venue: str, name: str):
+        # enabled is the only thing checked on the hot path when profiling is off
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self.stages, (venue, name))
+
+    def _sample(self):
+        me = threading.get_ident()
+        names = {}
+        while self.enabled:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    file_name = os.path.basename(code.co_filename)
+                    stack.append(f"{file_name}:{code.co_qualname}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+            time.sleep(self.interval_ms / 1000)
+
+    def start(self):
+        with self.lock:
+            if self.enabled:
+                return
+            self.stages.clear()
+            self.stacks.clear()
+            self.started = time.monotonic()
+            self.enabled = True
+            self.sampler = threading.Thread(
+                target=self._sample, name="profiler", daemon=True
+            )
+            self.sampler.start()
+        logger.info("Profiling started, sampling every {} ms", self.interval_ms)
+
+    def stop(self) -> str | None:
+        with self.lock:
+            if not self.enabled:
+                return None
+            self.enabled = False
+        self.sampler.join()
+        return self.dump()
+
+    def toggle(self):
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+
+    def summary(self) -> list[str]:
+        lines = [
+            f"{'venue':<12} {'stage':<10} {'calls':>10} {'wall ms':>10} {'cpu ms':>10} "
+            f"{'mean us':>9} {'max ms':>8}"
+        ]
+        for (venue, name), (count, wall, cpu, longest) in sorted(
+            list(self.stages.items()), key=lambda s: -s[1][1]
+        ):
+            lines.append(
+                f"{venue:<12} {name:<10} {count:>10} {wall / 1e6:>10.1f} "
+                f"{cpu / 1e6:>10.1f} {wall / count / 1e3:>9.1f} {longest / 1e6:>8.2f}"
+            )
+        return lines
+
+    def dump(self) -> str:
+        path = f"profile-{datetime.now().strftime('%Y%m%dT%H%M%S')}"
+        # folded stacks, for flamegraph.pl or speedscope
+        with open(f"{path}.folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        summary = self.summary()
+        with open(f"{path}-stages.txt", "w") as f:
+            f.write("\n".join(summary) + "\n")
+
+        logger.info(
+            "Profiled {:.0f} s, {} samples in {}.folded, stages (inclusive):\n{}",
+            time.monotonic() - self.started,
+            self.stacks.total(),
+            path,
+            "\n".join(summary),
+        )
+        return path
+
+    def install_signal_handler(self):
+        signal.signal(TOGGLE_SIGNAL, lambda *_: self.toggle())
+
+
+PROFILER = Profiler()
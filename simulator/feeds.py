@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import math
+import random
+import time
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _random_size(mean: float, decimals: int) -> float:
+    return round(random.expovariate(1 / mean) + 10**-decimals, decimals)
+
+
+def token_ids_for(slug: str, outcomes=("Up", "Down")) -> list[str]:
+    # deterministic 77 digit token ids so the gamma stand-in and the feed agree per slug
+    return [
+        str(int(hashlib.sha256(f"{slug}-{o}".encode()).hexdigest(), 16))[:77]
+        for o in outcomes
+    ]
+
+
+class BinanceBookTickerFeed:
+    def __init__(self, symbol: str, price=100_000.0):
+        self.symbol = symbol.upper()
+        self.mid = price
+        self.update_id = 0
+
+    def next_message(self) -> str:
+        self.update_id += 1
+        self.mid = max(self.mid + random.gauss(0, 1.5), 1)
+        return json.dumps(
+            {
+                "u": self.update_id,
+                "s": self.symbol,
+                "b": f"{self.mid - 0.005:.2f}",
+                "B": f"{_random_size(2, 5):.5f}",
+                "a": f"{self.mid + 0.005:.2f}",
+                "A": f"{_random_size(2, 5):.5f}",
+            }
+        )
+
+
+class HyperliquidL2BookFeed:
+    def __init__(self, coin: str, n_sig_figs=None, levels=20, price=100_000.0):
+        self.coin = coin
+        self.n_sig_figs = n_sig_figs
+        self.levels = levels
+        self.mid = price
+
+    def _tick(self) -> float:
+        if self.n_sig_figs is None:
+            return 1.0
+        return 10 ** (math.floor(math.log10(self.mid)) + 1 - self.n_sig_figs)
+
+    def _level(self, price: float) -> dict:
+        return {
+            "px": f"{price:g}" if price < 1e6 else f"{price:.0f}",
+            "sz": f"{_random_size(1, 5):.5f}",
+            "n": random.randint(1, 20),
+        }
+
+    def next_message(self) -> str:
+        self.mid = max(self.mid + random.gauss(0, 5), 1)
+        tick = self._tick()
+        best_bid = math.floor(self.mid / tick) * tick
+        return json.dumps(
+            {
+                "channel": "l2Book",
+                "data": {
+                    "coin": self.coin,
+                    "time": _now_ms(),
+                    "levels": [
+                        [self._level(best_bid - i * tick) for i in range(self.levels)],
+                        [
+                            self._level(best_bid + (i + 1) * tick)
+                            for i in range(self.levels)
+                        ],
+                    ],
+                },
+            }
+        )
+
+
+class HyperliquidTradesFeed:
+    def __init__(self, coin: str, price=100_000.0):
+        self.coin = coin
+        self.price = price
+        self.trade_id = 0
+
+    def next_message(self) -> str:
+        trades = []
+        for _ in range(random.randint(1, 3)):
+            self.trade_id += 1
+            self.price = max(self.price + random.gauss(0, 5), 1)
+            trades.append(
+                {
+                    "coin": self.coin,
+                    "side": random.choice("AB"),
+                    "px": f"{self.price:.0f}",
+                    "sz": f"{_random_size(0.1, 5):.5f}",
+                    "time": _now_ms(),
+                    "hash": f"0x{self.trade_id:064x}",
+                    "tid": self.trade_id,
+                }
+            )
+        return json.dumps({"channel": "trades", "data": trades})
+
+
+class HyperliquidBboFeed:
+    def __init__(self, coin: str, price=100_000.0):
+        self.coin = coin
+        self.mid = price
+
+    def next_message(self) -> str:
+        self.mid = max(self.mid + random.gauss(0, 5), 1)
+        return json.dumps(
+            {
+                "channel": "bbo",
+                "data": {
+                    "coin": self.coin,
+                    "time": _now_ms(),
+                    "bbo": [
+                        {
+                            "px": f"{self.mid - 0.5:.0f}",
+                            "sz": f"{_random_size(1, 5):.5f}",
+                            "n": random.randint(1, 20),
+                        },
+                        {
+                            "px": f"{self.mid + 0.5:.0f}",
+                            "sz": f"{_random_size(1, 5):.5f}",
+                            "n": random.randint(1, 20),
+                        },
+                    ],
+                },
+            }
+        )
+
+
+class PolymarketMarketFeed:
+    TICK = 0.01
+
+    def __init__(self, asset_ids: list[str], levels=10, market="0x0", drop_rate=0.0):
+        self.asset_ids = asset_ids
+        self.levels = levels
+        self.market = market
+        # share of price changes applied but never sent, so the capture's books drift
+        self.drop_rate = drop_rate
+        self.books = {}
+        for asset_id in asset_ids:
+            self.books[asset_id] = {
+                "BUY": {
+                    round(0.5 - (j + 1) * self.TICK, 2): _random_size(500, 2)
+                    for j in range(levels)
+                },
+                "SELL": {
+                    round(0.5 + j * self.TICK, 2): _random_size(500, 2)
+                    for j in range(levels)
+                },
+            }
+
+    @staticmethod
+    def _hash(summary: dict) -> str:
+        # the venue hashes its REST book summary with an empty hash field
+        return hashlib.sha1(
+            json.dumps(summary | {"hash": ""}, separators=(",", ":")).encode()
+        ).hexdigest()
+
+    def book_summary(self, asset_id: str) -> dict:
+        """The REST /book response for a token."""
+        book = self.books[asset_id]
+        summary = {
+            "market": self.market,
+            "asset_id": asset_id,
+            "timestamp": str(_now_ms()),
+            "hash": "",
+            "bids": [
+                {"price": f"{p:.2f}", "size": f"{s:.2f}"}
+                for p, s in sorted(book["BUY"].items())
+            ],
+            "asks": [
+                {"price": f"{p:.2f}", "size": f"{s:.2f}"}
+                for p, s in sorted(book["SELL"].items(), reverse=True)
+            ],
+            "min_order_size": "5",
+            "tick_size": f"{self.TICK}",
+            "neg_risk": False,
+        }
+        return summary | {"hash": self._hash(summary)}
+
+    def _book_event(self, asset_id: str) -> dict:
+        summary = self.book_summary(asset_id)
+        return {
+            "event_type": "book",
+            "asset_id": asset_id,
+            "market": self.market,
+            "bids": summary["bids"],
+            "asks": summary["asks"],
+            "timestamp": summary["timestamp"],
+            "hash": summary["hash"],
+        }
+
+    def _price_change_event(self, asset_id: str) -> dict:
+        book = self.books[asset_id]
+        side = random.choice(["BUY", "SELL"])
+        levels = book[side]
+        other = book["SELL" if side == "BUY" else "BUY"]
+
+        roll = random.random()
+        if roll < 0.15 and len(levels) > 1:
+            price = random.choice(list(levels))
+            size = 0.0
+            levels.pop(price)
+        elif roll < 0.3:
+            # new level just outside the current book, never crossing the other side
+            price = (
+                round(min(levels, default=0.5) - self.TICK, 2)
+                if side == "BUY"
+                else round(max(levels, default=0.5) + self.TICK, 2)
+            )
+            if not (0 < price < 1) or price in other:
+                price = random.choice(list(levels))
+            size = _random_size(500, 2)
+            levels[price] = size
+        else:
+            price = random.choice(list(levels))
+            size = _random_size(500, 2)
+            levels[price] = size
+
+        return {
+            "event_type": "price_change",
+            "asset_id": asset_id,
+            "market": self.market,
+            "changes": [
+                {
+                    "price": f"{price:.2f}",
+                    "side": side,
+                    "size": f"{size:.2f}",
+                    "best_bid": f"{max(book['BUY'], default=0):.2f}",
+                    "best_ask": f"{min(book['SELL'], default=0):.2f}",
+                }
+            ],
+            "timestamp": str(_now_ms()),
+            "hash": self.book_summary(asset_id)["hash"],
+        }
+
+    def _last_trade_price_event(self, asset_id: str) -> dict:
+        book = self.books[asset_id]
+        side = random.choice(["BUY", "SELL"])
+        levels = book["SELL" if side == "BUY" else "BUY"]
+        price = (min if side == "BUY" else max)(levels, default=0.5)
+        return {
+            "event_type": "last_trade_price",
+            "asset_id": asset_id,
+            "market": self.market,
+            "price": f"{price:.2f}",
+            "side": side,
+            "size": f"{_random_size(50, 2):.2f}",
+            "fee_rate_bps": "0",
+            "timestamp": str(_now_ms()),
+        }
+
+    def snapshot_messages(self) -> list[str]:
+        return [json.dumps([self._book_event(a)]) for a in self.asset_ids]
+
+    def next_message(self) -> str:
+        while True:
+            asset_id = random.choice(self.asset_ids)
+            roll = random.random()
+            if roll < 0.01:
+                event = self._book_event(asset_id)
+            elif roll < 0.1:
+                event = self._last_trade_price_event(asset_id)
+            else:
+                event = self._price_change_event(asset_id)
+                if random.random() < self.drop_rate:
+                    continue
+
+            return json.dumps([event])
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import polars as pl
+from loguru import logger
+
+from bus.event_bus import EVENT_BUS
+from config_manager import load_logging_config
+from simulator.feeds import token_ids_for
+from simulator.server import VENUES
+
+import binance_capture.websocket_capture as binance_capture
+import hyperliquid_capture.websocket_capture as hyperliquid_capture
+import polymarket.websocket_capture as polymarket_capture
+from polymarket.market_info import Token
+
+# fraction of the offered rate the pipeline must keep up with to count as unsaturated
+SATURATION_RATIO = 0.95
+WARMUP_SECONDS = 2
+
+
+class Counter:
+    def __init__(self):
+        self.events = 0
+
+    def __call__(self, venue: str, data_type: str, data: dict):
+        self.events += 1
+
+
+def wait_for_port(host: str, port: int, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+    raise TimeoutError(f"Stand-in server did not start on {host}:{port}")
+
+
+def _start_capture(venue: str, base: str):
+    match venue:
+        case "binance":
+            connection = binance_capture.run_capture(f"{base}/binance")
+        case "hyperliquid":
+            connection = hyperliquid_capture.run_capture(f"{base}/hyperliquid/ws")
+        case "polymarket":
+            tokens = [
+                Token(token_name=n, token_id=i)
+                for n, i in zip(["Up", "Down"], token_ids_for("load-test"))
+            ]
+            connection = polymarket_capture.WebsocketOrderBookCapture(
+                polymarket_capture.Channel.MARKET_CHANNEL,
+                f"{base}/polymarket",
+                tokens,
+                None,
+            )
+            connection.run()
+
+    return connection
+
+
+def measure(
+    venue: str, rate: float, duration: float, host: str, port: int, pregenerate=0
+) -> dict:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "simulator.server",
+            "--host",
+            host,
+            "--port",
+            str(port),
+            "--rate",
+            str(rate),
+            "--venues",
+            venue,
+            "--pregenerate",
+            str(pregenerate),
+        ],
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(host, port)
+        counter = Counter()
+        subscription = EVENT_BUS.subscribe(counter, venues=[venue])
+
+        # the captures write relative to the working directory, as in production
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory(prefix="load-test-") as output_dir:
+            os.chdir(output_dir)
+            try:
+                connection = _start_capture(venue, f"ws://{host}:{port}")
+
+                time.sleep(WARMUP_SECONDS)
+                events_before = counter.events
+                start = time.perf_counter()
+                time.sleep(duration)
+                processed = (counter.events - events_before) / (
+                    time.perf_counter() - start
+                )
+
+                connection.stop()
+            finally:
+                EVENT_BUS.unsubscribe(subscription)
+                os.chdir(cwd)
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "venue": venue,
+        "offered_rate": rate,
+        "processed_rate": processed,
+        "ratio": processed / rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ramp the stand-in server rate to find where a capture saturates."
+    )
+    parser.add_argument("--venues", nargs="+", choices=VENUES, default=VENUES)
+    parser.add_argument(
+        "--rates",
+        nargs="+",
+        type=float,
+        default=[1e3, 5e3, 1e4, 2.5e4, 5e4, 1e5],
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pregenerate", type=int, default=0)
+    args = parser.parse_args()
+
+    load_logging_config()
+
+    results = []
+    for venue in args.venues:
+        for rate in args.rates:
+            result = measure(
+                venue, rate, args.duration, args.host, args.port, args.pregenerate
+            )
+            logger.info(
+                "{} at {:.0f} msg/s: processed {:.0f} msg/s",
+                venue,
+                rate,
+                result["processed_rate"],
+            )
+            results.append(result)
+
+            if result["ratio"] < SATURATION_RATIO:
+                logger.info("{} saturated at {:.0f} msg/s", venue, rate)
+                break
+
+    with pl.Config(tbl_rows=-1):
+        print(pl.DataFrame(results))
+
+
+if __name__ == "__main__":
+    main()
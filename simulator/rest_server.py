@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import zlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from loguru import logger
+
+MINUTE_MS = 60_000
+TRADES_PER_MINUTE = 120
+# aggregate trade ids are derived from time, so paging by fromId matches paging by time
+TRADE_ID_SPACING_MS = MINUTE_MS // TRADES_PER_MINUTE
+PERPS = ["BTC", "ETH", "SOL", "HYPE", "XRP", "DOGE"]
+
+
+def _rng(*key) -> random.Random:
+    # deterministic per symbol and minute, repeated requests see the same history
+    return random.Random(zlib.crc32(":".join(map(str, key)).encode()))
+
+
+def _candle(symbol: str, open_time: int, price=100_000.0) -> dict:
+    rng = _rng(symbol, "candle", open_time)
+    o = price * (1 + rng.gauss(0, 0.001))
+    c = o * (1 + rng.gauss(0, 0.0005))
+    return {
+        "t": open_time,
+        "T": open_time + MINUTE_MS - 1,
+        "o": o,
+        "h": max(o, c) * (1 + abs(rng.gauss(0, 0.0002))),
+        "l": min(o, c) * (1 - abs(rng.gauss(0, 0.0002))),
+        "c": c,
+        "v": round(rng.uniform(1, 50), 5),
+        "n": TRADES_PER_MINUTE,
+    }
+
+
+def _agg_trade(symbol: str, trade_id: int) -> dict:
+    rng = _rng(symbol, "trade", trade_id)
+    t = trade_id * TRADE_ID_SPACING_MS
+    return {
+        "a": trade_id,
+        "p": f"{100_000.0 * (1 + rng.gauss(0, 0.001)):.2f}",
+        "q": f"{rng.expovariate(10):.5f}",
+        "f": trade_id,
+        "l": trade_id,
+        "T": t,
+        "m": rng.random() < 0.5,
+        "M": True,
+    }
+
+
+def agg_trades(query: dict) -> list:
+    symbol = query["symbol"]
+    limit = min(int(query.get("limit", 500)), 1000)
+    if "fromId" in query:
+        first = int(query["fromId"])
+        last = first + limit - 1
+    else:
+        start, end = int(query["startTime"]), int(query["endTime"])
+        if end - start > 60 * MINUTE_MS:
+            raise ValueError("startTime and endTime must be within one hour")
+        first = -(-start // TRADE_ID_SPACING_MS)
+        last = min(end // TRADE_ID_SPACING_MS, first + limit - 1)
+    return [_agg_trade(symbol, i) for i in range(first, last + 1)]
+
+
+def klines(query: dict) -> list:
+    symbol = query["symbol"]
+    limit = min(int(query.get("limit", 500)), 1000)
+    start = -(-int(query["startTime"]) // MINUTE_MS) * MINUTE_MS
+    end = int(query["endTime"])
+    rows = []
+    for open_time in range(start, end + 1, MINUTE_MS)[:limit]:
+        c = _candle(symbol, open_time)
+        rows.append(
+            [
+                c["t"],
+                f"{c['o']:.2f}",
+                f"{c['h']:.2f}",
+                f"{c['l']:.2f}",
+                f"{c['c']:.2f}",
+                f"{c['v']:.5f}",
+                c["T"],
+                "0",
+                c["n"],
+                "0",
+                "0",
+                "0",
+            ]
+        )
+    return rows
+
+
+def candle_snapshot(req: dict) -> list:
+    start = -(-int(req["startTime"]) // MINUTE_MS) * MINUTE_MS
+    end = int(req["endTime"])
+    candles = []
+    for open_time in range(start, end + 1, MINUTE_MS)[:5000]:
+        c = _candle(req["coin"], open_time)
+        candles.append(
+            {
+                "t": c["t"],
+                "T": c["T"],
+                "s": req["coin"],
+                "i": req["interval"],
+                "o": f"{c['o']:.1f}",
+                "c": f"{c['c']:.1f}",
+                "h": f"{c['h']:.1f}",
+                "l": f"{c['l']:.1f}",
+                "v": str(c["v"]),
+                "n": c["n"],
+            }
+        )
+    return candles
+
+
+def meta() -> dict:
+    universe = [{"name": c, "szDecimals": 5, "maxLeverage": 40} for c in PERPS]
+    # delisted perps stay in the universe, flagged
+    universe.append(
+        {"name": "DELISTED", "szDecimals": 2, "maxLeverage": 3, "isDelisted": True}
+    )
+    return {"universe": universe}
+
+
+class StandInRestServer(ThreadingHTTPServer):
+    def __init__(self, host="localhost", port=8766, error_rate=0.0):
+        super().__init__((host, port), _Handler)
+        self.host = host
+        self.port = port
+        self.error_rate = error_rate
+
+    def urls(self) -> dict[str, str]:
+        base = f"http://{self.host}:{self.port}"
+        return {
+            "BINANCE_API_URL": f"{base}/binance/api",
+            "HYPERLIQUID_API_URL": f"{base}/hyperliquid/info",
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StandInRestServer
+
+    def _respond(self, status: HTTPStatus, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if status == HTTPStatus.TOO_MANY_REQUESTS:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _throttled(self) -> bool:
+        if random.random() < self.server.error_rate:
+            self._respond(HTTPStatus.TOO_MANY_REQUESTS, {"msg": "stand-in throttle"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self._throttled():
+            return
+
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            match url.path:
+                case "/binance/api/v3/aggTrades":
+                    self._respond(HTTPStatus.OK, agg_trades(query))
+                case "/binance/api/v3/klines":
+                    self._respond(HTTPStatus.OK, klines(query))
+                case _:
+                    self._respond(HTTPStatus.NOT_FOUND, {"msg": url.path})
+        except (KeyError, ValueError) as e:
+            self._respond(HTTPStatus.BAD_REQUEST, {"msg": str(e)})
+
+    def do_POST(self):
+        if self._throttled():
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        match self.path, body.get("type"):
+            case "/hyperliquid/info", "candleSnapshot":
+                self._respond(HTTPStatus.OK, candle_snapshot(body["req"]))
+            case "/hyperliquid/info", "meta":
+                self._respond(HTTPStatus.OK, meta())
+            case _:
+                self._respond(HTTPStatus.NOT_FOUND, {"msg": self.path})
+
+    def log_message(self, format, *args):
+        logger.debug("{} {}", self.address_string(), format % args)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Binance and Hyperliquid history endpoints."
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of requests answered with 429, to exercise retries",
+    )
+    args = parser.parse_args()
+
+    server = StandInRestServer(args.host, args.port, args.error_rate)
+    for k, v in server.urls().items():
+        logger.info("{}={}", k, v)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+from http import HTTPStatus
+from itertools import cycle
+from urllib.parse import parse_qs, urlparse
+
+from loguru import logger
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+
+from simulator.feeds import (
+    BinanceBookTickerFeed,
+    HyperliquidBboFeed,
+    HyperliquidL2BookFeed,
+    HyperliquidTradesFeed,
+    PolymarketMarketFeed,
+    token_ids_for,
+)
+
+VENUES = ["binance", "hyperliquid", "polymarket"]
+
+# maximum frames sent per pacing step, so a slow reader cannot trigger an unbounded burst
+MAX_BURST = 1000
+STATS_INTERVAL_SECONDS = 10
+
+
+class StandInServer:
+    def __init__(
+        self,
+        host="localhost",
+        port=8765,
+        rate=1000.0,
+        venues=VENUES,
+        pregenerate=0,
+        drop_rate=0.0,
+    ):
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.venues = venues
+        self.pregenerate = pregenerate
+        self.drop_rate = drop_rate
+        self.polymarket_feeds = {}  # token id -> latest feed streaming it, for /book
+        self.sent = Counter()
+        self.connections = Counter()
+        self.streams = {}  # streaming task per connection
+
+    def urls(self) -> dict[str, str]:
+        base = f"ws://{self.host}:{self.port}"
+        return {
+            "BINANCE_WSS_URL": f"{base}/binance",
+            "HYPERLIQUID_WSS_URL": f"{base}/hyperliquid/ws",
+            "POLYMARKET_WSS_URL": f"{base}/polymarket",
+            "POLYMARKET_GAMMA_URL": f"http://{self.host}:{self.port}/polymarket",
+            "POLYMARKET_CLOB_URL": f"http://{self.host}:{self.port}/polymarket",
+        }
+
+    def process_request(self, connection: ServerConnection, request):
+        # plain HTTP requests on the same port stand in for the Polymarket gamma and
+        # CLOB REST APIs
+        url = urlparse(request.path)
+        if url.path == "/polymarket/book":
+            token_id = parse_qs(url.query).get("token_id", [""])[0]
+            if token_id not in self.polymarket_feeds:
+                return connection.respond(HTTPStatus.NOT_FOUND, "unknown token_id")
+
+            return connection.respond(
+                HTTPStatus.OK,
+                json.dumps(self.polymarket_feeds[token_id].book_summary(token_id)),
+            )
+
+        if url.path == "/polymarket/markets":
+            slug = parse_qs(url.query).get("slug", ["stand-in"])[0]
+            return connection.respond(
+                HTTPStatus.OK,
+                json.dumps(
+                    [
+                        {
+                            "slug": slug,
+                            "conditionId": "0x" + hashlib.sha256(slug.encode()).hexdigest(),
+                            "outcomes": json.dumps(["Up", "Down"]),
+                            "clobTokenIds": json.dumps(token_ids_for(slug)),
+                        }
+                    ]
+                ),
+            )
+
+        return None
+
+    def _restart_stream(self, connection: ServerConnection, venue: str, next_message):
+        if connection in self.streams:
+            self.streams.pop(connection).cancel()
+
+        if self.pregenerate:
+            # replay a fixed pool of frames so generation cost does not cap the rate
+            next_message = cycle(
+                [next_message() for _ in range(self.pregenerate)]
+            ).__next__
+
+        self.streams[connection] = asyncio.create_task(
+            self._stream(connection, venue, next_message)
+        )
+
+    async def _stream(self, connection: ServerConnection, venue: str, next_message):
+        try:
+            await self._paced_send(connection, venue, next_message)
+        except ConnectionClosed:
+            pass
+
+    async def _paced_send(self, connection: ServerConnection, venue: str, next_message):
+        start = time.perf_counter()
+        sent = 0
+        while True:
+            due = min(int((time.perf_counter() - start) * self.rate) - sent, MAX_BURST)
+            if due <= 0:
+                await asyncio.sleep(0.001)
+                continue
+
+            for _ in range(due):
+                await connection.send(next_message())
+
+            sent += due
+            self.sent[venue] += due
+
+            # drop the backlog instead of bursting if the reader cannot keep up
+            if int((time.perf_counter() - start) * self.rate) - sent > self.rate:
+                start = time.perf_counter()
+                sent = 0
+
+    async def _binance(self, connection: ServerConnection):
+        feeds = {}
+        async for message in connection:
+            request = json.loads(message)
+            match request.get("method"):
+                case "SUBSCRIBE":
+                    for s in request["params"]:
+                        symbol, _, channel = s.partition("@")
+                        if channel == "bookTicker":
+                            feeds[s] = BinanceBookTickerFeed(symbol)
+                case "UNSUBSCRIBE":
+                    for s in request["params"]:
+                        feeds.pop(s, None)
+                case "LIST_SUBSCRIPTIONS":
+                    await connection.send(
+                        json.dumps({"result": list(feeds), "id": request.get("id")})
+                    )
+                    continue
+
+            await connection.send(json.dumps({"result": None, "id": request.get("id")}))
+
+            if feeds:
+                messages = cycle([f.next_message for f in feeds.values()])
+                self._restart_stream(
+                    connection, "binance", lambda: next(messages)()
+                )
+
+    async def _hyperliquid(self, connection: ServerConnection):
+        feeds = {}
+        async for message in connection:
+            request = json.loads(message)
+            match request.get("method"):
+                case "ping":
+                    await connection.send(json.dumps({"channel": "pong"}))
+                    continue
+                case "subscribe":
+                    subscription = request["subscription"]
+                    key = json.dumps(subscription, sort_keys=True)
+                    match subscription["type"]:
+                        case "l2Book":
+                            feeds[key] = HyperliquidL2BookFeed(
+                                subscription["coin"], subscription.get("nSigFigs")
+                            )
+                        case "trades":
+                            feeds[key] = HyperliquidTradesFeed(subscription["coin"])
+                        case "bbo":
+                            feeds[key] = HyperliquidBboFeed(subscription["coin"])
+                case "unsubscribe":
+                    feeds.pop(json.dumps(request["subscription"], sort_keys=True), None)
+
+            await connection.send(
+                json.dumps({"channel": "subscriptionResponse", "data": request})
+            )
+
+            if feeds:
+                messages = cycle([f.next_message for f in feeds.values()])
+                self._restart_stream(
+                    connection, "hyperliquid", lambda: next(messages)()
+                )
+
+    async def _polymarket(self, connection: ServerConnection):
+        async for message in connection:
+            if message == "PING":
+                await connection.send("PONG")
+                continue
+
+            request = json.loads(message)
+            if request.get("type") != "market":
+                logger.warning("Unsupported polymarket subscription {}", request)
+                continue
+
+            feed = PolymarketMarketFeed(
+                request["assets_ids"], drop_rate=self.drop_rate
+            )
+            self.polymarket_feeds |= dict.fromkeys(request["assets_ids"], feed)
+            for snapshot in feed.snapshot_messages():
+                await connection.send(snapshot)
+
+            self._restart_stream(connection, "polymarket", feed.next_message)
+
+    async def handler(self, connection: ServerConnection):
+        path = urlparse(connection.request.path).path
+        match path.split("/")[1:]:
+            case ["binance", "ws"] if "binance" in self.venues:
+                venue, handle = "binance", self._binance
+            case ["hyperliquid", "ws"] if "hyperliquid" in self.venues:
+                venue, handle = "hyperliquid", self._hyperliquid
+            case ["polymarket", "ws", "market"] if "polymarket" in self.venues:
+                venue, handle = "polymarket", self._polymarket
+            case _:
+                logger.warning("Rejecting connection to unknown path {}", path)
+                await connection.close(code=1008, reason="unknown path")
+                return
+
+        logger.info("New {} connection from {}", venue, connection.remote_address)
+        self.connections[venue] += 1
+        try:
+            await handle(connection)
+        except ConnectionClosed:
+            pass
+        finally:
+            self.connections[venue] -= 1
+            if connection in self.streams:
+                self.streams.pop(connection).cancel()
+
+    async def _report(self):
+        previous = Counter()
+        while True:
+            await asyncio.sleep(STATS_INTERVAL_SECONDS)
+            for venue in self.venues:
+                logger.info(
+                    "{}: {} connections, {:.0f} msg/s",
+                    venue,
+                    self.connections[venue],
+                    (self.sent[venue] - previous[venue]) / STATS_INTERVAL_SECONDS,
+                )
+            previous = self.sent.copy()
+
+    async def serve(self):
+        async with serve(
+            self.handler,
+            self.host,
+            self.port,
+            process_request=self.process_request,
+            max_queue=None,
+        ) as server:
+            for name, url in self.urls().items():
+                logger.info("{}={}", name, url)
+
+            reporter = asyncio.create_task(self._report())
+            try:
+                await server.serve_forever()
+            finally:
+                reporter.cancel()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in websocket server for the capture venues."
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=1000.0,
+        help="messages per second per connection",
+    )
+    parser.add_argument("--venues", nargs="+", choices=VENUES, default=VENUES)
+    parser.add_argument(
+        "--pregenerate",
+        type=int,
+        default=0,
+        help="replay this many pre-generated frames per connection (stale timestamps, higher rates)",
+    )
+    parser.add_argument(
+        "--drop-rate",
+        type=float,
+        default=0.0,
+        help="share of Polymarket price changes not sent, to exercise book resyncs",
+    )
+    args = parser.parse_args()
+
+    StandInServer(
+        args.host, args.port, args.rate, args.venues, args.pregenerate, args.drop_rate
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import os
+import threading
+
+# row columns holding SYMBOLS ids instead of strings
+SYMBOL_COLUMNS = ("asset_id", "event_type")
+SYMBOLS_FILE = "symbols.parquet"  # the id -> symbol table written next to each hour
+
+
+class SymbolRegistry:
+    """Compact integer ids for the venue, asset and event type strings rows repeat.
+
+    Every parsed message brings its own copy of these strings (a Polymarket asset id
+    alone is 77 digits), so rows carry an id or the registry's interned copy instead.
+    Ids are handed out in order of first use and never change while the process
+    runs, writers decode them back to dictionary encoded columns.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.symbols = []
+        self.lock = threading.Lock()
+
+    def id_of(self, symbol: str) -> int:
+        symbol_id = self.ids.get(symbol)
+        if symbol_id is not None:
+            return symbol_id
+
+        with self.lock:
+            symbol_id = self.ids.get(symbol)
+            if symbol_id is None:
+                symbol_id = len(self.symbols)
+                self.symbols.append(symbol)
+                self.ids[symbol] = symbol_id
+            return symbol_id
+
+    def symbol_of(self, symbol_id: int) -> str:
+        return self.symbols[symbol_id]
+
+    def intern(self, symbol: str) -> str:
+        """The registry's copy of a string, shared by every row that holds it."""
+        return self.symbols[self.id_of(symbol)]
+
+    def decode(self, data: dict, columns=SYMBOL_COLUMNS) -> dict:
+        """A copy of a row with its symbol ids replaced by the strings."""
+        return data | {
+            c: self.symbols[data[c]] for c in columns if isinstance(data.get(c), int)
+        }
+
+    def enum(self):
+        import polars as pl  # only the frames need polars, not the capture's hot path
+
+        # the physical codes of this Enum are the registry ids
+        return pl.Enum(list(self.symbols))
+
+    def to_frame(self):
+        import polars as pl
+
+        symbols = list(self.symbols)
+        return pl.DataFrame(
+            {"id": range(len(symbols)), "symbol": symbols},
+            schema={"id": pl.UInt32, "symbol": pl.String},
+        )
+
+    def write(self, directory: str) -> str:
+        path = os.path.join(directory, SYMBOLS_FILE)
+        self.to_frame().write_parquet(path)
+        return path
+
+
+SYMBOLS = SymbolRegistry()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import json
+import signal
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+
+from loguru import logger
+
+DUMP_SIGNAL = signal.SIGQUIT
+
+
+class Tracer:
+    def __init__(self, sample_rate=0, ring_size=1000):
+        self.logger = logger.bind(trace=True)
+        self.sink_id = None
+        self.configure(sample_rate, ring_size)
+
+    def configure(self, sample_rate=0, ring_size=1000, sink=None):
+        # enabled is the only thing checked on the hot path when tracing is off
+        self.sample_rate = sample_rate
+        self.enabled = sample_rate > 0
+        self.counters = defaultdict(int)
+        self.frames = deque(maxlen=ring_size) if ring_size else None
+
+        if self.sink_id is not None:
+            try:
+                logger.remove(self.sink_id)
+            except ValueError:
+                pass  # already removed by logger.configure
+            self.sink_id = None
+        if self.enabled and sink:
+            self.sink_id = logger.add(
+                sink,
+                level="TRACE",
+                filter=lambda r: "trace" in r["extra"],
+                enqueue=True,
+            )
+
+    def record(self, venue: str, frame: str):
+        if self.frames is not None:
+            self.frames.append((time.time(), venue, frame))
+
+    def sample(self, venue: str, asset: str) -> bool:
+        self.counters[(venue, asset)] += 1
+        return (self.counters[(venue, asset)] - 1) % self.sample_rate == 0
+
+    def trace(self, message: str, *args):
+        self.logger.trace(message, *args)
+
+    def dump(self, reason: str) -> str | None:
+        if not self.frames:
+            return None
+
+        path = f"frames-{datetime.now().strftime('%Y%m%dT%H%M%S')}.jsonl"
+        frames = list(self.frames)
+        with open(path, "w") as f:
+            for t, venue, frame in frames:
+                f.write(json.dumps({"time": t, "venue": venue, "frame": frame}) + "\n")
+
+        logger.warning("Dumped last {} raw frames to {} ({})", len(frames), path, reason)
+        return path
+
+    def install_signal_handler(self):
+        signal.signal(DUMP_SIGNAL, lambda *_: self.dump("signal"))
+
+
+TRACER = Tracer()
@@ -3,16 +3,52 @@
 import datetime
 import json
 import re
+import threading
 import time
 
 from loguru import logger
 
 import pytz
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from constants import BINANCE_API_URL, HYPERLIQUID_API_URL
 
 MAX_RETRIES = 5
+RETRY_STATUSES = (418, 429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second
+        self.next = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next, now)
+            self.next = slot + self.interval
+        time.sleep(slot - now)
+
+
+def make_session(pool_size=10, retries=MAX_RETRIES) -> requests.Session:
+    # one pooled session shared by all threads, retrying throttling and server errors
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # the POST info endpoints are read-only too
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
 def convert_timestamp(timestamp: str) -> datetime:
@@ -103,3 +139,16 @@ def get_hyperliquid_target_price(symbol: str) -> float:
         logger.warning("No open price for hyperliquid!")
 
     return open_price
+
+
+def get_hyperliquid_perps() -> list[str]:
+    """Every perp coin listed on Hyperliquid, from the meta universe."""
+    session = make_session()
+    response = session.post(HYPERLIQUID_API_URL, json={"type": "meta"}, timeout=10)
+    response.raise_for_status()
+
+    return [
+        asset["name"]
+        for asset in response.json()["universe"]
+        if not asset.get("isDelisted", False)
+    ]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable
+
+from loguru import logger
+
+from config_manager import load_conflation_config
+
+
+class Mode(Enum):
+    LAST_PER_INTERVAL = "last_per_interval"
+    TOP_OF_BOOK_CHANGE = "top_of_book_change"
+    MIN_INTERVAL = "min_interval"
+
+
+@dataclass
+class ConflationPolicy:
+    mode: Mode
+    interval_seconds: float = 1.0
+    include_sizes: bool = False  # top_of_book_change: also emit on size-only changes
+    data_types: tuple = ("orderbook",)
+
+
+def load_policies(venue: str) -> dict[str, ConflationPolicy]:
+    return {
+        asset_name: ConflationPolicy(
+            mode=Mode(p["mode"]),
+            interval_seconds=p.get("interval_seconds", 1.0),
+            include_sizes=p.get("include_sizes", False),
+            data_types=tuple(p.get("data_types", ["orderbook"])),
+        )
+        for asset_name, p in (load_conflation_config().get(venue) or {}).items()
+    }
+
+
+def _top_of_book(row: dict, include_sizes: bool) -> tuple:
+    top = (
+        row.get("bid_1_price", row.get("bid_price")),
+        row.get("ask_1_price", row.get("ask_price")),
+    )
+    if include_sizes:
+        top += (
+            row.get("bid_1_size", row.get("bid_size")),
+            row.get("ask_1_size", row.get("ask_size")),
+        )
+    return top
+
+
+class Conflator:
+    def __init__(
+        self,
+        venue: str,
+        write: Callable[[str, str, dict], None],
+        policies: dict[str, ConflationPolicy] | None = None,
+    ):
+        self.venue = venue
+        self.write = write
+        # keyed by asset name, "*" applies to every asset without its own policy
+        self.policies = load_policies(venue) if policies is None else policies
+        self.held = {}  # (data_type, asset_name) -> (interval, row) for last_per_interval
+        self.last_emitted = {}  # (data_type, asset_name) -> time or top of book
+        self.received = Counter()
+        self.conflated = Counter()
+        # shared by a venue's connections (Polymarket shards each run a thread), the
+        # write stays under it so a held row never lands after its successor
+        self.lock = threading.Lock()
+
+    def _policy(self, data_type: str, asset_name: str) -> ConflationPolicy | None:
+        policy = self.policies.get(asset_name) or self.policies.get("*")
+        if policy is None or data_type not in policy.data_types:
+            return None
+        return policy
+
+    def on_event(self, venue: str, data_type: str, data: dict):
+        if not self.policies:
+            self.write(venue, data_type, data)
+            return
+
+        asset_name = data["asset_name"]
+        policy = self._policy(data_type, asset_name)
+        if policy is None:
+            self.write(venue, data_type, data)
+            return
+
+        with self.lock:
+            self._conflate(policy, venue, data_type, data)
+
+    def _conflate(self, policy: ConflationPolicy, venue: str, data_type: str, data):
+        key = (data_type, data["asset_name"])
+        self.received[key] += 1
+
+        match policy.mode:
+            case Mode.LAST_PER_INTERVAL:
+                interval = int(data["timestamp"].timestamp() // policy.interval_seconds)
+                held = self.held.get(key)
+                self.held[key] = (interval, data)
+                if held is None:
+                    return
+                if held[0] == interval:
+                    self.conflated[key] += 1
+                    return
+                self.write(venue, data_type, held[1])
+            case Mode.MIN_INTERVAL:
+                now = data["timestamp"].timestamp()
+                last = self.last_emitted.get(key)
+                if last is not None and now - last < policy.interval_seconds:
+                    self.conflated[key] += 1
+                    return
+                self.last_emitted[key] = now
+                self.write(venue, data_type, data)
+            case Mode.TOP_OF_BOOK_CHANGE:
+                top = _top_of_book(data, policy.include_sizes)
+                if self.last_emitted.get(key) == top:
+                    self.conflated[key] += 1
+                    return
+                self.last_emitted[key] = top
+                self.write(venue, data_type, data)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                f"{asset_name}-{data_type}": {
+                    "received": self.received[(data_type, asset_name)],
+                    "conflated": self.conflated[(data_type, asset_name)],
+                }
+                for data_type, asset_name in self.received
+            }
+
+    def close(self):
+        # the last row of each open interval is still held back
+        with self.lock:
+            for (data_type, _), (_, row) in self.held.items():
+                self.write(self.venue, data_type, row)
+            self.held.clear()
+
+        if self.received:
+            logger.info("Conflation counters for {}: {}", self.venue, self.stats())
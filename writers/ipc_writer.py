@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from typing import Iterator
+
+import polars as pl
+import pyarrow as pa
+from loguru import logger
+
+from symbols import SYMBOL_COLUMNS, SYMBOLS
+
+END_OF_STREAM = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+class IpcWriter:
+    """Appends rows as Arrow IPC stream record batches, one file per asset and data type.
+
+    Every batch is written through as soon as it is built so other processes can
+    memory-map the file and read it while capture is running (see tail below). A
+    batch with columns the open file's schema does not have starts a new segment.
+    Symbol ids in rows are written as their strings, so readers need no lookup.
+    """
+
+    def __init__(
+        self,
+        batch_size=100,
+        max_batch_seconds=1.0,
+        output_dir=".",
+        symbol_columns=SYMBOL_COLUMNS,
+        symbols=SYMBOLS,
+    ):
+        self.batch_size = batch_size
+        self.max_batch_seconds = max_batch_seconds
+        self.output_dir = output_dir
+        self.symbol_columns = symbol_columns
+        self.symbols = symbols
+        self.lock = threading.RLock()
+        self.asset_name_to_data = defaultdict(lambda: defaultdict(list))
+        self.batch_started = defaultdict(dict)
+        self.streams = defaultdict(dict)  # asset_name -> data_type -> (sink, writer, schema)
+        self.iterations = defaultdict(lambda: defaultdict(lambda: 1))
+        self.stopped = threading.Event()
+        if max_batch_seconds:
+            # batches of quiet assets are written on time, not on their next row
+            threading.Thread(
+                target=self._check_ages,
+                args=(weakref.ref(self), self.stopped, max_batch_seconds / 2),
+                name="ipc-writer-age",
+                daemon=True,
+            ).start()
+
+    def __del__(self):
+        self.close()
+
+    def _path(self, asset_name: str, data_type: str) -> str:
+        return os.path.join(
+            self.output_dir,
+            f"{asset_name.lower()}-{data_type.lower()}-{self.iterations[asset_name][data_type]}.arrow",
+        )
+
+    def _close_stream(self, asset_name: str, data_type: str):
+        sink, writer, _ = self.streams[asset_name].pop(data_type)
+        writer.close()  # writes the end-of-stream marker
+        sink.close()
+        self.iterations[asset_name][data_type] += 1
+
+    def _decode_symbols(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        symbol_columns = [
+            c
+            for c in self.symbol_columns
+            if c in batch.schema.names
+            and pa.types.is_integer(batch.schema.field(c).type)
+        ]
+        if not symbol_columns:
+            return batch
+
+        symbols = pa.array(self.symbols.symbols, pa.string())
+        for c in symbol_columns:
+            i = batch.schema.get_field_index(c)
+            batch = batch.set_column(i, c, symbols.take(batch.column(i)))
+        return batch
+
+    def _batch(self, asset_name: str, data_type: str, rows: list[dict]):
+        # the stream keeps the schema of the rows, batches are decoded after building
+        stream = self.streams[asset_name].get(data_type)
+        if stream is not None:
+            schema = stream[2]
+            if {k for row in rows for k in row} <= set(schema.names):
+                try:
+                    batch = pa.RecordBatch.from_pylist(rows, schema=schema)
+                    return stream, self._decode_symbols(batch)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    pass
+
+            logger.debug("Schema changed for {} {}, new segment", asset_name, data_type)
+            self._close_stream(asset_name, data_type)
+
+        batch = pa.RecordBatch.from_pylist(rows)
+        decoded = self._decode_symbols(batch)
+        sink = pa.OSFile(self._path(asset_name, data_type), "wb")
+        stream = self.streams[asset_name][data_type] = (
+            sink,
+            pa.ipc.new_stream(sink, decoded.schema),
+            batch.schema,
+        )
+        return stream, decoded
+
+    def flush_buffer(self, asset_name: str, data_type: str):
+        with self.lock:
+            rows = self.asset_name_to_data[asset_name][data_type]
+            if not rows:
+                return
+
+            (sink, writer, _), batch = self._batch(asset_name, data_type, rows)
+            writer.write_batch(batch)
+            sink.flush()
+
+            rows.clear()
+            self.batch_started[asset_name].pop(data_type, None)
+
+    @staticmethod
+    def _check_ages(writer_ref, stopped: threading.Event, interval: float):
+        # holds the writer only during a check, so an unclosed writer can still go
+        while not stopped.wait(interval):
+            writer = writer_ref()
+            if writer is None:
+                return
+            writer.flush_aged()
+            del writer
+
+    def flush_aged(self):
+        now = time.monotonic()
+        with self.lock:
+            for k in list(self.batch_started):
+                for dt, started in list(self.batch_started[k].items()):
+                    if now - started >= self.max_batch_seconds:
+                        self.flush_buffer(k, dt)
+
+    def flush(self):
+        with self.lock:
+            for k in list(self.asset_name_to_data):
+                for dt in list(self.asset_name_to_data[k]):
+                    self.flush_buffer(k, dt)
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            self.flush()
+            for k in list(self.streams):
+                for dt in list(self.streams[k]):
+                    self._close_stream(k, dt)
+
+    def on_event(self, venue: str, data_type: str, data: dict):
+        self.write(data_type, data)
+
+    def write(self, data_type: str, data: dict):
+        asset_name = data["asset_name"]
+        with self.lock:
+            rows = self.asset_name_to_data[asset_name][data_type]
+            rows.append(data)
+
+            started = self.batch_started[asset_name].setdefault(
+                data_type, time.monotonic()
+            )
+            if len(rows) >= self.batch_size or (
+                self.max_batch_seconds
+                and time.monotonic() - started >= self.max_batch_seconds
+            ):
+                self.flush_buffer(asset_name, data_type)
+
+
+def tail(path: str, poll_seconds=0.5, follow=True) -> Iterator[pa.RecordBatch]:
+    """Yield record batches from an IPC stream file, following it while it is written.
+
+    The file is memory-mapped, so batches reference the page cache without copying.
+    Each poll reads on from the end of the last complete message.
+    """
+    schema = None
+    offset = 0
+    while True:
+        with pa.memory_map(path) as source:
+            size = source.size()
+            # a reader treats a truncated stream as ended, only the marker means closed
+            complete = size >= 8 and source.read_at(8, size - 8) == END_OF_STREAM
+            try:
+                if schema is None:
+                    schema = pa.ipc.open_stream(source).schema
+                    offset = source.tell()
+
+                source.seek(offset)
+                while True:
+                    message = pa.ipc.read_message(source)
+                    offset = source.tell()
+                    yield pa.ipc.read_record_batch(message, schema)
+            except EOFError:
+                pass  # the end-of-stream marker
+            except (pa.ArrowInvalid, OSError):
+                pass  # the writer is part way through a batch (or the schema)
+
+        if complete or not follow:
+            return
+        time.sleep(poll_seconds)
+
+
+def convert_to_parquet(path: str, compression="zstd", compression_level=None) -> str:
+    """Rewrite a closed IPC stream file as compressed Parquet next to it."""
+    parquet_path = path.removesuffix(".arrow") + ".parquet"
+    data = pl.read_ipc_stream(path)
+    # symbol columns are dictionary encoded, as the Parquet writer writes them
+    data.with_columns(
+        pl.col(c).cast(pl.Categorical) for c in SYMBOL_COLUMNS if c in data.columns
+    ).write_parquet(
+        parquet_path, compression=compression, compression_level=compression_level
+    )
+    os.remove(path)
+    return parquet_path
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert closed Arrow IPC capture files to Parquet."
+    )
+    parser.add_argument("paths", nargs="+", help="files or glob patterns")
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--compression-level", type=int)
+    args = parser.parse_args()
+
+    for pattern in args.paths:
+        for path in glob.glob(pattern):
+            logger.info(
+                "Converted {} to {}",
+                path,
+                convert_to_parquet(path, args.compression, args.compression_level),
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import sys
+import threading
+import time
+import weakref
+from enum import Enum
+
+from loguru import logger
+
+from constants import (
+    MAX_BUFFER_AGE_SECONDS,
+    MEMORY_BUDGET_BYTES,
+    MEMORY_BUDGET_POLICY,
+    SPILL_DIRECTORY,
+)
+
+# relieve pressure down to this fraction of the budget so we do not flush on every write
+LOW_WATERMARK = 0.8
+AGE_CHECK_INTERVAL_SECONDS = 1
+
+
+def estimate_row_bytes(row: dict) -> int:
+    # keys are shared between rows, so only the dict itself and its values are counted
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+class Policy(Enum):
+    LARGEST = "largest"
+    OLDEST = "oldest"
+
+
+class MemoryBudget:
+    def __init__(
+        self,
+        max_bytes=MEMORY_BUDGET_BYTES,
+        max_age_seconds=MAX_BUFFER_AGE_SECONDS,
+        spill_directory=SPILL_DIRECTORY,
+        policy=MEMORY_BUDGET_POLICY,
+    ):
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.spill_directory = spill_directory
+        self.policy = Policy(policy)
+        self.writers = weakref.WeakSet()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.relief_lock = threading.Lock()
+        self.age_thread = None
+        self.stopped = threading.Event()
+        self.flushes = 0
+        self.spills = 0
+        self.age_flushes = 0
+
+    def register(self, writer):
+        with self.lock:
+            self.writers.add(writer)
+
+            if self.max_age_seconds and self.age_thread is None:
+                self.age_thread = threading.Thread(
+                    target=self._check_ages, name="memory-budget-age", daemon=True
+                )
+                self.age_thread.start()
+
+    def account(self, delta: int) -> bool:
+        with self.lock:
+            self.total_bytes += delta
+            return self.total_bytes > self.max_bytes
+
+    def _candidates(self):
+        return [
+            (writer, asset_name, data_type, nbytes, started)
+            for writer in list(self.writers)
+            for asset_name, data_type, nbytes, started in writer.buffers()
+        ]
+
+    def relieve(self):
+        # only one thread relieves pressure at a time, the others keep capturing
+        if not self.relief_lock.acquire(blocking=False):
+            return
+
+        try:
+            while self.total_bytes > self.max_bytes * LOW_WATERMARK:
+                candidates = [c for c in self._candidates() if c[3] > 0]
+                if not candidates:
+                    break
+
+                if self.policy == Policy.OLDEST:
+                    writer, asset_name, data_type, nbytes, _ = min(
+                        candidates, key=lambda c: c[4]
+                    )
+                else:
+                    writer, asset_name, data_type, nbytes, _ = max(
+                        candidates, key=lambda c: c[3]
+                    )
+
+                logger.info(
+                    "Memory budget exceeded ({} > {} bytes), {} {} {} ({} bytes)",
+                    self.total_bytes,
+                    self.max_bytes,
+                    "spilling" if self.spill_directory else "flushing",
+                    asset_name,
+                    data_type,
+                    nbytes,
+                )
+
+                if self.spill_directory:
+                    writer.spill(asset_name, data_type, self.spill_directory)
+                    self.spills += 1
+                else:
+                    writer.flush_buffer(asset_name, data_type)
+                    self.flushes += 1
+        finally:
+            self.relief_lock.release()
+
+    def _check_ages(self):
+        while not self.stopped.wait(AGE_CHECK_INTERVAL_SECONDS):
+            self._flush_aged()
+
+    def _flush_aged(self):
+        # kept out of the loop in _check_ages so no writer reference outlives a check
+        now = time.monotonic()
+        for writer, asset_name, data_type, _, started in self._candidates():
+            if now - started >= self.max_age_seconds:
+                logger.debug(
+                    "Flushing {} {} older than {}s",
+                    asset_name,
+                    data_type,
+                    self.max_age_seconds,
+                )
+                writer.flush_buffer(asset_name, data_type)
+                self.age_flushes += 1
+
+    def stop(self):
+        self.stopped.set()
+
+    def stats(self) -> dict:
+        return {
+            "writers": len(self.writers),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "flushes": self.flushes,
+            "spills": self.spills,
+            "age_flushes": self.age_flushes,
+        }
+
+
+MEMORY_BUDGET = MemoryBudget()
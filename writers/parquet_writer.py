@@ -1,5 +1,8 @@
 #!/usr/bin/env python3
 
+import os
+import threading
+import time
 from collections import defaultdict
 
 import polars as pl
@@ -7,54 +10,223 @@ from loguru import logger
 
 from tqdm import tqdm
 
+from profiling import PROFILER
+from symbols import SYMBOL_COLUMNS, SYMBOLS
+from writers.memory_budget import MEMORY_BUDGET, estimate_row_bytes
+
 
 class ParquetWriter:
-    def __init__(self, buffer_size=1000):
+    def __init__(
+        self,
+        buffer_size=1000,
+        compression="zstd",
+        compression_level=None,
+        row_group_size=None,
+        statistics=True,
+        categorical_columns=(),
+        symbol_columns=SYMBOL_COLUMNS,
+        output_dir=".",
+        progress=True,
+        max_buffer_bytes=None,
+        memory_budget=MEMORY_BUDGET,
+        symbols=SYMBOLS,
+    ):
         self.data = pl.LazyFrame()
         self.buffer_size = buffer_size
+        self.compression = compression
+        self.compression_level = compression_level
+        self.row_group_size = int(row_group_size) if row_group_size else None
+        self.statistics = statistics
+        self.categorical_columns = categorical_columns
+        self.symbol_columns = symbol_columns  # columns holding SYMBOLS ids
+        self.symbols = symbols
+        self.output_dir = output_dir
+        self.progress = progress
+        self.max_buffer_bytes = max_buffer_bytes
+        self.memory_budget = memory_budget
+        self.lock = threading.RLock()
         self.asset_name_to_data = defaultdict(lambda: defaultdict(list))
         self.progress_bars = {}  # store tqdm objects per asset_id
         self.iterations = defaultdict(lambda: defaultdict(lambda: 1))
 
+        # estimated bytes held per buffer, the per-row estimate is refreshed on every flush
+        self.buffer_bytes = defaultdict(lambda: defaultdict(int))
+        self.row_bytes = defaultdict(dict)
+        self.buffer_started = defaultdict(dict)  # monotonic time of the oldest row
+        self.spilled = defaultdict(lambda: defaultdict(list))  # spill files per buffer
+        self.spilled_rows = defaultdict(lambda: defaultdict(int))
+
+        if self.memory_budget is not None:
+            self.memory_budget.register(self)
+
     def __del__(self):
-        for k in self.asset_name_to_data:
-            for dt in self.asset_name_to_data[k]:
-                self._flush_data(k, dt)
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            for k in list(self.asset_name_to_data):
+                for dt in list(self.asset_name_to_data[k]):
+                    self.flush_buffer(k, dt)
+
+    def close(self):
+        # a long running capture replaces its writers every hour, so the bars go too
+        with self.lock:
+            self.flush()
+            for bars in self.progress_bars.values():
+                for bar in bars.values():
+                    bar.close()
+            self.progress_bars.clear()
+
+    def flush_buffer(self, asset_name: str, data_type: str):
+        with self.lock:
+            if (
+                self.asset_name_to_data[asset_name][data_type]
+                or self.spilled[asset_name][data_type]
+            ):
+                self._flush_data(asset_name, data_type)
+
+    def buffers(self):
+        with self.lock:
+            return [
+                (k, dt, self.buffer_bytes[k][dt], self.buffer_started[k][dt])
+                for k in self.buffer_started
+                for dt in self.buffer_started[k]
+            ]
+
+    def _file_name(self, asset_name: str, data_type: str) -> str:
+        return f"{asset_name.lower()}-{data_type.lower()}-{self.iterations[asset_name][data_type]}"
+
+    def _release(self, asset_name: str, data_type: str):
+        released = self.buffer_bytes[asset_name][data_type]
+        self.buffer_bytes[asset_name][data_type] = 0
+        self.asset_name_to_data[asset_name][data_type].clear()
+        self.row_bytes[asset_name].pop(data_type, None)
+
+        if self.memory_budget is not None:
+            self.memory_budget.account(-released)
+
+    def spill(self, asset_name: str, data_type: str, spill_directory: str):
+        with self.lock:
+            rows = self.asset_name_to_data[asset_name][data_type]
+            if not rows:
+                return
+
+            os.makedirs(spill_directory, exist_ok=True)
+            spills = self.spilled[asset_name][data_type]
+            path = os.path.join(
+                spill_directory,
+                f"{self._file_name(asset_name, data_type)}.spill-{len(spills)}.arrow",
+            )
+            pl.DataFrame(rows).write_ipc(path, compression="uncompressed")
+            logger.debug("Spilled {} rows to {}", len(rows), path)
+
+            spills.append(path)
+            self.spilled_rows[asset_name][data_type] += len(rows)
+            self._release(asset_name, data_type)
 
     def _flush_data(self, asset_name: str, data_type: str):
+        with PROFILER.stage("writer", "flush"):
+            self._write_parquet(asset_name, data_type)
+
+    def _write_parquet(self, asset_name: str, data_type: str):
         logger.debug("Flushing {} Parquet data for {}", data_type, asset_name)
         asset_data = pl.LazyFrame(self.asset_name_to_data[asset_name][data_type])
-        asset_data = asset_data.collect().write_parquet(
-            f"{asset_name.lower()}-{data_type.lower()}-{self.iterations[asset_name][data_type]}.parquet",
-            compression="zstd",
+        spills = self.spilled[asset_name][data_type]
+        if spills:
+            asset_data = pl.concat(
+                [pl.scan_ipc(p) for p in spills] + [asset_data],
+                how="diagonal_relaxed",
+            )
+
+        schema = asset_data.collect_schema()
+        symbol_columns = [
+            c for c in self.symbol_columns if c in schema and schema[c].is_integer()
+        ]
+        if symbol_columns:
+            # the registry Enum's codes are the ids, files are written Categorical so
+            # ones flushed before and after a new symbol still concatenate
+            enum = self.symbols.enum()
+            asset_data = asset_data.with_columns(
+                pl.col(c).cast(pl.UInt32).cast(enum).cast(pl.Categorical)
+                for c in symbol_columns
+            )
+
+        if self.categorical_columns:
+            asset_data = asset_data.with_columns(
+                pl.col(c).cast(pl.Categorical)
+                for c in self.categorical_columns
+                if c in schema
+            )
+
+        asset_data.collect().write_parquet(
+            os.path.join(
+                self.output_dir, f"{self._file_name(asset_name, data_type)}.parquet"
+            ),
+            compression=self.compression,
+            compression_level=self.compression_level,
+            row_group_size=self.row_group_size,
+            statistics=self.statistics,
         )
 
+        for p in spills:
+            os.remove(p)
+        spills.clear()
+        self.spilled_rows[asset_name][data_type] = 0
+        self.buffer_started[asset_name].pop(data_type, None)
+
         self.iterations[asset_name][data_type] += 1
         self.progress_bars[asset_name][data_type].reset()
         self.progress_bars[asset_name][data_type].set_description(
-            f"{asset_name.lower()}-{data_type.lower()}-{self.iterations[asset_name][data_type]}"
+            self._file_name(asset_name, data_type)
+        )
+        self._release(asset_name, data_type)
+
+    def _progress_bar(self, asset_name: str, data_type: str) -> tqdm:
+        return tqdm(
+            desc=self._file_name(asset_name, data_type),
+            total=self.buffer_size,
+            disable=not self.progress,
         )
-        self.asset_name_to_data[asset_name][data_type].clear()
+
+    def on_event(self, venue: str, data_type: str, data: dict):
+        self.write(data_type, data)
 
     def write(self, data_type: str, data: dict):
         asset_name = data["asset_name"]
-        self.asset_name_to_data[asset_name][data_type].append(data)
-
-        if asset_name not in self.progress_bars:
-            self.progress_bars[asset_name] = {
-                data_type: tqdm(
-                    desc=f"{asset_name.lower()}-{data_type.lower()}-{self.iterations[asset_name][data_type]}",
-                    total=self.buffer_size,
-                )
-            }
-        else:
-            if data_type not in self.progress_bars[asset_name]:
-                self.progress_bars[asset_name][data_type] = tqdm(
-                    desc=f"{asset_name.lower()}-{data_type.lower()}-{self.iterations[asset_name][data_type]}",
-                    total=self.buffer_size,
-                )
-
-            self.progress_bars[asset_name][data_type].update(1)
-
-        if len(self.asset_name_to_data[asset_name][data_type]) >= self.buffer_size:
-            self._flush_data(asset_name, data_type)
+        with self.lock:
+            self.asset_name_to_data[asset_name][data_type].append(data)
+
+            if data_type not in self.row_bytes[asset_name]:
+                self.row_bytes[asset_name][data_type] = estimate_row_bytes(data)
+            if data_type not in self.buffer_started[asset_name]:
+                self.buffer_started[asset_name][data_type] = time.monotonic()
+
+            row_bytes = self.row_bytes[asset_name][data_type]
+            self.buffer_bytes[asset_name][data_type] += row_bytes
+
+            with PROFILER.stage("writer", "progress"):
+                if asset_name not in self.progress_bars:
+                    self.progress_bars[asset_name] = {
+                        data_type: self._progress_bar(asset_name, data_type)
+                    }
+                else:
+                    if data_type not in self.progress_bars[asset_name]:
+                        self.progress_bars[asset_name][data_type] = (
+                            self._progress_bar(asset_name, data_type)
+                        )
+
+                    self.progress_bars[asset_name][data_type].update(1)
+
+            if (
+                len(self.asset_name_to_data[asset_name][data_type])
+                + self.spilled_rows[asset_name][data_type]
+                >= self.buffer_size
+            ) or (
+                self.max_buffer_bytes
+                and self.buffer_bytes[asset_name][data_type] >= self.max_buffer_bytes
+            ):
+                self._flush_data(asset_name, data_type)
+
+        # accounted outside our own lock, relieving pressure may flush other writers
+        if self.memory_budget is not None and self.memory_budget.account(row_bytes):
+            self.memory_budget.relieve()
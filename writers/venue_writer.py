@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+from bus.event_bus import EVENT_BUS, EventBus
+from constants import OUTPUT_FORMAT
+from writers.conflation import Conflator
+
+
+class VenueWriter:
+    """A venue's writer, fed every event the venue publishes via its conflation stage.
+
+    One is shared by all connections of a venue, so sharded subscriptions still end up
+    in one file per asset and data type. It stays subscribed across rotations, only
+    the writer behind it is replaced.
+    """
+
+    def __init__(
+        self,
+        venue: str,
+        output_format=OUTPUT_FORMAT,
+        bus: EventBus = EVENT_BUS,
+        **writer_options,
+    ):
+        self.venue = venue
+        self.output_format = output_format
+        self.bus = bus
+        self.writer, self.conflator = self._pipeline(writer_options)
+        self.subscription = bus.subscribe(self.on_event, venues=[venue])
+
+    def _pipeline(self, writer_options: dict):
+        if self.output_format == "ipc":
+            from writers.ipc_writer import IpcWriter  # pyarrow is only needed for ipc
+
+            writer = IpcWriter(**writer_options)
+        else:
+            from writers.parquet_writer import ParquetWriter  # polars, on first use
+
+            writer = ParquetWriter(**writer_options)
+        return writer, Conflator(self.venue, writer.on_event)
+
+    def on_event(self, venue: str, data_type: str, data: dict):
+        self.conflator.on_event(venue, data_type, data)
+
+    def rotate(self, output_format=None, **writer_options):
+        """Sends further events to a new writer, returns the old writer and conflator.
+
+        Pass them to close_pipeline once events the old ones were already handling
+        have finished.
+        """
+        self.output_format = output_format or self.output_format
+        writer, conflator = self._pipeline(writer_options)
+        old = self.writer, self.conflator
+        self.writer = writer
+        self.conflator = conflator  # the swap on_event sees
+        return old
+
+    def close(self):
+        if self.subscription is None:
+            return
+
+        self.bus.unsubscribe(self.subscription)
+        self.subscription = None
+        close_pipeline((self.writer, self.conflator))
+        self.conflator = None
+        self.writer = None
+
+
+def close_pipeline(pipeline):
+    writer, conflator = pipeline
+    conflator.close()  # writes rows still held back for an open interval
+    writer.close()